@@ -1,30 +1,171 @@
+from collections import Counter
 from db import get_db
 import requests
-from expense_classifier import ExpenseClassifier
+from model_registry import registry
+from description_cache import description_cache
+from score_store import score_store
+from normalization import canonicalize_description
+from profiler import Profiler, metrics
+
+
+def count_pending_rows(user_id, file_id):
+    """Count the rows of a file that still need a category."""
+    query = """
+        SELECT COUNT(*)
+        FROM expense_insights.expenses
+        WHERE user_id = %s AND file_id = %s
+        AND (category IS NULL OR category = '')
+    """
+    try:
+        db, cursor = get_db()
+        cursor.execute(query, (user_id, file_id))
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Error counting rows: {e}")
+        return 0
+
+
+def classify_descriptions(descriptions, engine, user_id="", use_cache=True):
+    """
+    Classify descriptions directly, without reading or writing the expenses table.
+
+    Cached categories (and the user's overrides) are served first, with the
+    confidence they were cached with. The remaining descriptions are
+    classified once per canonical form through the engine, and the results
+    are cached.
+
+    Args:
+        descriptions: Raw transaction descriptions
+        engine: Object with a classify_detailed(descriptions) method
+        user_id: User whose overrides apply; empty for global results only
+        use_cache: Whether to read and write the description cache
+
+    Returns:
+        List of dictionaries with 'description', 'category', 'confidence'
+        and 'tier' keys, in input order
+    """
+    classifier = registry.get_classifier()
+    version = classifier.version
+    cached = (description_cache.lookup_detailed(user_id, descriptions, version)
+              if use_cache else {})
+
+    pending = {}
+    for desc in descriptions:
+        if desc not in cached:
+            pending.setdefault(canonicalize_description(desc), desc)
+    classified = {}
+    if pending:
+        representatives = list(pending.values())
+        results = engine.classify_detailed(representatives)
+        classified = dict(zip(pending, results))
+        if use_cache:
+            description_cache.store(
+                {desc: result["category"] for desc, result in zip(representatives, results)},
+                version,
+                {desc: result["confidence"] for desc, result in zip(representatives, results)})
+            scores = {desc: result["scores"]
+                      for desc, result in zip(representatives, results) if "scores" in result}
+            if scores:
+                score_store.store(scores, classifier.score_version)
+
+    response = []
+    for desc in descriptions:
+        if desc in cached:
+            category, confidence = cached[desc]
+            response.append({"description": desc, "category": category,
+                             "confidence": confidence, "tier": "cache"})
+        else:
+            result = classified[canonicalize_description(desc)]
+            response.append({"description": desc, "category": result["category"],
+                             "confidence": result["confidence"], "tier": result["tier"]})
+    return response
+
 
 class BatchClassifier:
-    def __init__(self, user_id, file_id):
+    def __init__(self, user_id, file_id, progress_callback=None, engine=None,
+                 write_chunk_size=500, fetch_page_size=1000):
         self.user_id = user_id
         self.file_id = file_id
+        # Called with (processed, total) distinct descriptions after each write-back
+        self.progress_callback = progress_callback
+        self.processed_count = 0
+        self.total_count = 0
         self.processed_description = {}
         self.row_query_limit = 10
         self.unique_description_count = 0
-        self.classifier = ExpenseClassifier(
-    "config.yaml",
-    classification_model="MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli",
-    embedding_model="sentence-transformers/all-MiniLM-L6-v2"
-)
+        # How many descriptions each tier (cache, keyword, exact, head, knn, nli, hybrid) decided
+        self.tier_counts = Counter()
+        # Group representative -> raw descriptions sharing its canonical key,
+        # for the page being processed
+        self.description_groups = {}
+        self.fetch_page_size = fetch_page_size
+        self.classifier = registry.get_classifier()
+        # What runs the models: the shared InferenceScheduler in the service,
+        # or the classifier itself when used on its own
+        self.engine = engine or self.classifier
+        self.classify_batch_size = getattr(self.engine, "batch_size", self.row_query_limit)
+        # (description, category) pairs waiting to be written back, and how
+        # many distinct descriptions one UPDATE statement applies
+        self.pending_updates = []
+        self.write_chunk_size = write_chunk_size
+        # Per-stage timings and counters for this job, also fed into the
+        # process-wide metrics
+        self.profiler = Profiler(parent=metrics)
 
     def process_table_data(self):
+        with self.profiler.stage("job"):
+            with self.profiler.stage("db_count"):
+                self.total_count = self.count_unique_descriptions()
+            self.report_progress()
+
+            # Classify page by page; each page is read once the previous one is done
+            for descriptions in self.get_unique_descriptions():
+                self.profiler.count("descriptions", len(descriptions))
+                self.process_page(descriptions)
+            self.flush_updates()
+
+    def profile(self):
+        """
+        Summarize where this job's time went.
 
-        descriptions = self.get_unique_descriptions()
+        Returns:
+            The job's Profiler snapshot with its user, file and tier counts
+        """
+        profile = self.profiler.snapshot()
+        profile.update({"user_id": self.user_id, "file_id": self.file_id,
+                        "tier_counts": dict(self.tier_counts)})
+        return profile
+
+    def process_page(self, descriptions):
+        """
+        Classify one page of distinct descriptions and stage their categories.
+
+        Only the page's own state is kept. Near-duplicates of descriptions
+        decided on earlier pages are served by the description cache.
+        """
+        self.processed_description = {}
+
+        # Classify each group of near-duplicate descriptions once
+        self.description_groups = self.group_descriptions(descriptions)
+        representatives = list(self.description_groups)
+
+        # Serve repeated descriptions from the shared cache before any model call
+        with self.profiler.stage("cache_lookup"):
+            cached = description_cache.lookup(
+                self.user_id, representatives, self.classifier.version)
+        self.profiler.count("cache_lookups", len(representatives))
+        self.profiler.count("cache_hits", len(cached))
+        for desc, category in cached.items():
+            self.store_result(desc, category)
+        self.tier_counts["cache"] += len(cached)
+        self.update_database(list(cached))
 
         batch = []
-        for desc in descriptions:
+        for desc in representatives:
             if desc in self.processed_description:
                 continue
             batch.append(desc)
-            if len(batch) == self.row_query_limit:
+            if len(batch) == self.classify_batch_size:
                 self.classify_and_store(batch)
                 self.update_database(batch)
                 batch = []
@@ -33,56 +174,158 @@ class BatchClassifier:
             self.classify_and_store(batch)
             self.update_database(batch)
 
-    def get_unique_descriptions(self):
+    def group_descriptions(self, descriptions):
+        """
+        Group raw descriptions by canonical key.
+
+        Returns:
+            Dictionary mapping the first raw description of each group to
+            every raw description in the group
+        """
+        groups = {}
+        for desc in descriptions:
+            groups.setdefault(canonicalize_description(desc), []).append(desc)
+        return {members[0]: members for members in groups.values()}
+
+    def store_result(self, desc, category):
+        """Record a group representative's category for every member of its group."""
+        for member in self.description_groups.get(desc, [desc]):
+            self.processed_description[member] = category
+
+    def report_progress(self):
+        if self.progress_callback:
+            self.progress_callback(self.processed_count, self.total_count)
+
+    def count_unique_descriptions(self):
         query = """
-            SELECT DISTINCT description 
+            SELECT COUNT(DISTINCT description)
             FROM expense_insights.expenses
             WHERE user_id = %s AND file_id = %s
             AND (category IS NULL OR category = '')
         """
-        db, cursor = None, None
         try:
             db, cursor = get_db()
             cursor.execute(query, (self.user_id, self.file_id))
-            return [row[0] for row in cursor.fetchall()]
+            return cursor.fetchone()[0]
         except Exception as e:
-            print(f"Error fetching descriptions: {e}")
-            return []
+            print(f"Error counting descriptions: {e}")
+            return 0
+
+    def get_unique_descriptions(self):
+        """
+        Yield pages of the file's uncategorized distinct descriptions.
+
+        Pages are read with keyset pagination on the (user_id, file_id,
+        description) index. No cursor stays open while a page is being
+        classified, so slow pages cannot time out the read. Errors are
+        raised, so the job fails instead of completing with pages missing.
+        """
+        query = """
+            SELECT DISTINCT description
+            FROM expense_insights.expenses
+            WHERE user_id = %s AND file_id = %s
+            AND (category IS NULL OR category = '')
+            AND description > %s
+            ORDER BY description
+            LIMIT %s
+        """
+        last_description = ""
+        while True:
+            with self.profiler.stage("db_fetch"):
+                db, cursor = get_db()
+                cursor.execute(query, (self.user_id, self.file_id, last_description,
+                                       self.fetch_page_size))
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            last_description = rows[-1][0]
+            yield [row[0] for row in rows]
+            if len(rows) < self.fetch_page_size:
+                break
 
 
     def classify_and_store(self,batch):
         try:
-            results = self.classifier.classify(batch)
-            print("results", results)
+            version = self.classifier.version
+            with self.profiler.stage("classify"):
+                results = self.engine.classify_detailed(batch)
             for desc, result in zip(batch, results):
-                self.processed_description[desc] = result
-                print(f"Processed: {desc} -> {result}")
+                self.store_result(desc, result["category"])
+                self.tier_counts[result["tier"]] += 1
+            scores = {desc: result["scores"]
+                      for desc, result in zip(batch, results) if "scores" in result}
+            if scores:
+                with self.profiler.stage("score_store"):
+                    score_store.store(scores, self.classifier.score_version)
+            with self.profiler.stage("cache_store"):
+                description_cache.store(
+                    {desc: self.processed_description[desc] for desc in batch}, version,
+                    {desc: result["confidence"] for desc, result in zip(batch, results)})
 
         except Exception as e:
+            # The page is not read again, so the job must fail rather than skip it
             print(f"Error during classification: {e}")
+            raise
 
 
     def update_database(self, batch):
-        if not batch:
-            return
+        """
+        Stage the categories of classified group representatives for write-back.
 
-        query = """
-            UPDATE expense_insights.expenses 
-            SET category = %s
-            WHERE user_id = %s AND file_id = %s AND description = %s
+        Every member of each group is staged. Full chunks are written as
+        soon as they fill up; call flush_updates() to write the rest.
+        """
+        for desc in batch:
+            if desc not in self.processed_description:
+                continue
+            for member in self.description_groups.get(desc, [desc]):
+                self.pending_updates.append((member, self.processed_description[member]))
+
+        while len(self.pending_updates) >= self.write_chunk_size:
+            chunk = self.pending_updates[:self.write_chunk_size]
+            self.pending_updates = self.pending_updates[self.write_chunk_size:]
+            self.write_chunk(chunk)
+
+    def flush_updates(self):
+        """Write back every staged category."""
+        chunk, self.pending_updates = self.pending_updates, []
+        if chunk:
+            self.write_chunk(chunk)
+
+    def write_chunk(self, chunk):
+        """
+        Apply a chunk of (description, category) pairs in one set-based UPDATE.
+
+        The rows are located through the (user_id, file_id, description)
+        index and each chunk commits in its own transaction. Every row is
+        stamped with the classifier version and marked as model output, so
+        the reclassifier can find it once the configuration changes. A failed
+        chunk is rolled back and its error raised, failing the job.
+        """
+        cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        placeholders = ", ".join(["%s"] * len(chunk))
+        query = f"""
+            UPDATE expense_insights.expenses
+            SET category = CASE description {cases} END, category_version = %s,
+                category_source = 'model'
+            WHERE user_id = %s AND file_id = %s AND description IN ({placeholders})
             AND (category IS NULL OR category = '')
         """
+        params = [value for pair in chunk for value in pair]
+        params += [self.classifier.version, self.user_id, self.file_id]
+        params += [desc for desc, _ in chunk]
 
         db, cursor = None, None
         try:
             db, cursor = get_db()
-            update_values = [
-                (self.processed_description[desc],
-                 self.user_id, self.file_id, desc)
-                for desc in batch
-            ]
-            cursor.executemany(query, update_values)
-            db.commit()
+            with self.profiler.stage("write_back"):
+                cursor.execute(query, params)
+                db.commit()
+            self.profiler.count("rows_written", cursor.rowcount)
+            self.processed_count += len(chunk)
+            self.report_progress()
         except Exception as e:
             print(f"Error updating database: {e}")
-            db.rollback()
+            if db:
+                db.rollback()
+            raise
@@ -0,0 +1,255 @@
+"""
+Throughput and accuracy benchmark for the expense classifier.
+
+Every combination of backend, mode and cache setting runs over the same
+labeled corpus, sampled from fixtures/benchmark_corpus.csv up to --size
+descriptions. Sampled rows get the kind of noise real bank exports carry
+(reference numbers, dates, card suffixes), so canonicalization and the
+cache see realistic repeats. Results are written as JSON, and two result
+files can be compared to catch speedups that cost accuracy.
+
+Usage:
+    python benchmark.py [--size 1000] [--modes hybrid,cascade]
+                        [--backends torch,onnx] [--cache off,on] [--output run.json]
+    python benchmark.py --compare baseline.json run.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import numpy as np
+from normalization import canonicalize_description
+
+if TYPE_CHECKING:
+    from expense_classifier import ExpenseClassifier
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "fixtures", "benchmark_corpus.csv")
+
+
+def load_corpus(path: str, size: int, seed: int) -> List[Tuple[str, str]]:
+    """
+    Sample `size` labeled descriptions from the fixture corpus.
+
+    The first pass over the corpus is used as is; further samples are
+    drawn at random and decorated with reference numbers or dates.
+    """
+    with open(path, newline="") as file:
+        rows = [(row["description"], row["category"]) for row in csv.DictReader(file)]
+
+    rng = np.random.default_rng(seed)
+    corpus = rows[:size]
+    while len(corpus) < size:
+        description, category = rows[rng.integers(len(rows))]
+        noise = rng.integers(3)
+        if noise == 0:
+            description = f"{description} REF{rng.integers(10 ** 6, 10 ** 7)}"
+        elif noise == 1:
+            description = f"{description} {rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}"
+        else:
+            description = f"{description} *{rng.integers(1000, 10000)}"
+        corpus.append((description, category))
+    return corpus
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the whole process so far, across every variant run."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory of the process right now, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def run_variant(classifier: "ExpenseClassifier", corpus: List[Tuple[str, str]],
+                batch_size: int, use_cache: bool) -> Dict[str, Any]:
+    """
+    Classify the corpus batch by batch and measure speed and accuracy.
+
+    With the cache on, results are memoized by canonical description, like
+    the in-memory layer of DescriptionCache, so repeats skip the models.
+    rss_delta_mb is the growth in resident memory during this variant;
+    process_peak_rss_mb is the process-wide peak, including the models and
+    the variants that ran before.
+    """
+    cache: Dict[str, Dict[str, Any]] = {}
+    latencies = []
+    predictions = []
+    tiers = Counter()
+    padding_before = classifier.padding_stats()
+    rss_before = current_rss_mb()
+
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch_size):
+        batch = [description for description, _ in corpus[i:i + batch_size]]
+        batch_start = time.perf_counter()
+
+        keys = [canonicalize_description(description) for description in batch]
+        pending = {}
+        if use_cache:
+            for key, description in zip(keys, batch):
+                if key not in cache:
+                    pending.setdefault(key, description)
+        else:
+            pending = dict(zip(range(len(batch)), batch))
+        results = dict(zip(pending, classifier.classify_detailed(list(pending.values()),
+                                                                 batch_size)))
+        for j, key in enumerate(keys):
+            if use_cache:
+                result = results.get(key)
+                if result is None:
+                    result = dict(cache[key], tier="cache")
+                else:
+                    cache[key] = result
+            else:
+                result = results[j]
+            predictions.append(result["category"])
+            tiers[result["tier"]] += 1
+
+        latencies.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    gold = [category for _, category in corpus]
+    confusion: Dict[str, Counter] = {}
+    for expected, predicted in zip(gold, predictions):
+        confusion.setdefault(expected, Counter())[predicted] += 1
+    padding_after = classifier.padding_stats()
+    tokens = padding_after["tokens"] - padding_before["tokens"]
+    padded_tokens = padding_after["padded_tokens"] - padding_before["padded_tokens"]
+    per_category = {
+        category: round(counts[category] / sum(counts.values()), 4)
+        for category, counts in sorted(confusion.items())
+    }
+
+    return {
+        "descriptions": len(corpus),
+        "seconds": round(elapsed, 3),
+        "descriptions_per_second": round(len(corpus) / elapsed, 2) if elapsed else 0.0,
+        "batch_latency_p50_ms": round(1000 * float(np.percentile(latencies, 50)), 2),
+        "batch_latency_p99_ms": round(1000 * float(np.percentile(latencies, 99)), 2),
+        "rss_delta_mb": (round(rss_after - rss_before, 1)
+                         if rss_before is not None and rss_after is not None else None),
+        "process_peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": round(float(np.mean([e == p for e, p in zip(gold, predictions)])), 4),
+        "per_category_accuracy": per_category,
+        "confusion": {expected: dict(counts) for expected, counts in sorted(confusion.items())},
+        "tier_counts": dict(tiers),
+        "nli_tokens": tokens,
+        "nli_padding_ratio": round(1 - tokens / padded_tokens, 4) if padded_tokens else 0.0,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    # Imported here so --compare works without the model libraries
+    from expense_classifier import ExpenseClassifier
+
+    corpus = load_corpus(args.corpus, args.size, args.seed)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "corpus": os.path.basename(args.corpus),
+        "size": len(corpus),
+        "batch_size": args.batch_size,
+        "variants": {},
+    }
+
+    for backend in args.backends.split(","):
+        # One classifier per backend; modes and cache settings reuse its models
+        classifier = ExpenseClassifier(
+            args.config,
+            classification_model=os.getenv("CLASSIFICATION_MODEL",
+                                           "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"),
+            embedding_model=os.getenv("EMBEDDING_MODEL",
+                                      "sentence-transformers/all-MiniLM-L6-v2"),
+            backend=backend,
+        )
+        for mode in args.modes.split(","):
+            classifier.mode = mode
+            for cache in args.cache.split(","):
+                name = f"{backend}/{mode}/cache-{cache}"
+                print(f"Running {name} over {len(corpus)} descriptions", file=sys.stderr)
+                result = run_variant(classifier, corpus, args.batch_size, cache == "on")
+                result["version"] = classifier.version
+                report["variants"][name] = result
+    return report
+
+
+def compare(baseline_path: str, candidate_path: str, max_accuracy_drop: float) -> int:
+    """
+    Print per-variant changes between two result files.
+
+    Returns:
+        Exit status: 1 if any shared variant lost more than max_accuracy_drop accuracy
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)["variants"]
+    with open(candidate_path) as file:
+        candidate = json.load(file)["variants"]
+
+    status = 0
+    print(f"{'variant':<32}{'desc/s':>18}{'p50 ms':>18}{'p99 ms':>18}{'accuracy':>22}")
+    for name in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[name], candidate[name]
+        columns = []
+        for key in ("descriptions_per_second", "batch_latency_p50_ms", "batch_latency_p99_ms"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            columns.append(f"{new[key]:>10.1f} ({change:+5.1f}%)")
+        accuracy_change = new["accuracy"] - old["accuracy"]
+        flag = ""
+        if -accuracy_change > max_accuracy_drop:
+            flag = "  REGRESSION"
+            status = 1
+        print(f"{name:<32}" + "".join(f"{column:>18}" for column in columns)
+              + f"{new['accuracy']:>12.4f} ({accuracy_change:+.4f}){flag}")
+    for name in sorted(set(baseline) ^ set(candidate)):
+        print(f"{name:<32}only in {'baseline' if name in baseline else 'candidate'}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default=os.getenv("CLASSIFIER_CONFIG", "config.yaml"))
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--modes", default="hybrid,cascade")
+    parser.add_argument("--backends", default="torch")
+    parser.add_argument("--cache", default="off,on")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two JSON reports instead of running")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                        help="Accuracy loss that --compare reports as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.max_accuracy_drop))
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import datetime
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+class ClassificationHead:
+    """
+    Logistic-regression head over sentence embeddings.
+
+    Trained offline (see train_head.py) on labeled descriptions. At serving
+    time it is one matrix product and a softmax per batch. The head is only
+    valid for the embedding model, backend and category list it was trained
+    with, so those are saved alongside the weights.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, categories: List[str],
+                 embedding_model: str, backend: str,
+                 metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            weights: Weight matrix of shape (embedding dim, categories)
+            bias: Bias vector of shape (categories,)
+            categories: Category names in column order
+            embedding_model: Embedding model the head was trained on
+            backend: Inference backend the embeddings came from
+            metadata: Training details (sample counts, holdout accuracy, ...)
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.categories = list(categories)
+        self.embedding_model = embedding_model
+        self.backend = backend
+        self.metadata = metadata or {}
+        self.version = hashlib.sha256(
+            self.weights.tobytes() + self.bias.tobytes()
+            + json.dumps([self.categories, embedding_model, backend]).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Category probabilities for a batch of embeddings.
+
+        Returns:
+            Array of shape (n, categories)
+        """
+        logits = embeddings @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def train(cls, embeddings: np.ndarray, labels: List[str], categories: List[str],
+              embedding_model: str, backend: str, regularization: float = 1.0,
+              metadata: Optional[Dict[str, Any]] = None) -> "ClassificationHead":
+        """
+        Fit a multinomial logistic regression on labeled embeddings.
+
+        Categories without any training sample get a large negative bias,
+        so the head never predicts them.
+
+        Args:
+            embeddings: Unit-length embeddings of shape (n, dim)
+            labels: Category of each embedding
+            categories: Full category list, in classifier order
+            embedding_model: Embedding model that produced the embeddings
+            backend: Inference backend that produced the embeddings
+            regularization: Inverse L2 regularization strength (scikit-learn's C)
+            metadata: Training details to store with the head
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        model = LogisticRegression(C=regularization, max_iter=1000)
+        model.fit(embeddings, labels)
+
+        weights = np.zeros((embeddings.shape[1], len(categories)), dtype=np.float32)
+        bias = np.full(len(categories), -1e4, dtype=np.float32)
+        coefficients, intercepts = model.coef_, model.intercept_
+        if len(model.classes_) == 2:
+            # scikit-learn keeps a single column for two classes
+            coefficients = np.vstack([-coefficients[0] / 2, coefficients[0] / 2])
+            intercepts = np.array([-intercepts[0] / 2, intercepts[0] / 2])
+        for row, category in enumerate(model.classes_):
+            column = categories.index(category)
+            weights[:, column] = coefficients[row]
+            bias[column] = intercepts[row]
+        return cls(weights, bias, categories, embedding_model, backend, metadata)
+
+    def save(self, directory: str) -> str:
+        """
+        Save the head as <directory>/head-<version>.npz.
+
+        Returns:
+            Path of the saved file
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"head-{self.version}.npz")
+        metadata = dict(self.metadata,
+                        saved_at=datetime.datetime.now().replace(microsecond=0).isoformat())
+        np.savez(path, weights=self.weights, bias=self.bias,
+                 categories=np.array(self.categories),
+                 embedding_model=self.embedding_model, backend=self.backend,
+                 metadata=json.dumps(metadata))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ClassificationHead":
+        """Load a head saved with save()."""
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], data["categories"].tolist(),
+                       str(data["embedding_model"]), str(data["backend"]),
+                       json.loads(str(data["metadata"])))
@@ -0,0 +1,197 @@
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from db import get_db
+from normalization import canonicalize_description
+
+GLOBAL_USER = ""
+ANY_VERSION = ""
+
+# Confidence reported for a user's override; the user chose the category
+OVERRIDE_CONFIDENCE = 1.0
+
+# Marks an override we looked up and know does not exist
+_NO_OVERRIDE = None
+_MISSING = object()
+
+
+class DescriptionCache:
+    """
+    Persistent description -> category cache shared across uploads and users.
+
+    Descriptions are keyed by their canonical form, so near-duplicates that
+    only differ in reference numbers or dates share one entry.
+
+    Global entries are written by the classifier and keyed by the classifier
+    version, so a config change never serves stale categories. Each entry
+    keeps the classifier's confidence, so cache hits report it too. Per-user
+    overrides are layered on top and apply to every version. The most recently
+    used entries are kept in an in-memory LRU in front of the
+    `category_cache` table.
+    """
+
+    def __init__(self, max_entries: int = 50000, lookup_chunk_size: int = 500):
+        self.max_entries = max_entries
+        self.lookup_chunk_size = lookup_chunk_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return _MISSING
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _resolve_in_memory(self, user_id: str, key: str, version: str):
+        override = self._get((user_id, ANY_VERSION, key))
+        if override is _MISSING:
+            return _MISSING
+        if override is not _NO_OVERRIDE:
+            return override
+        category = self._get((GLOBAL_USER, version, key))
+        return _MISSING if category is _MISSING else category
+
+    def lookup(self, user_id: str, descriptions: Iterable[str], version: str) -> Dict[str, str]:
+        """
+        Look up categories for many descriptions at once.
+
+        Args:
+            user_id: The user whose overrides take precedence
+            descriptions: Raw transaction descriptions
+            version: Classifier version the global entries must match
+
+        Returns:
+            Dictionary mapping each cached description to its category
+        """
+        return {description: category for description, (category, _)
+                in self.lookup_detailed(user_id, descriptions, version).items()}
+
+    def lookup_detailed(self, user_id: str, descriptions: Iterable[str],
+                        version: str) -> Dict[str, Tuple[str, Optional[float]]]:
+        """
+        Look up categories and their confidence for many descriptions at once.
+
+        Returns:
+            Dictionary mapping each cached description to a (category,
+            confidence) pair; entries cached before confidences were stored
+            have None
+        """
+        found = {}
+        pending: Dict[str, List[str]] = {}
+        for description in descriptions:
+            key = canonicalize_description(description)
+            entry = self._resolve_in_memory(user_id, key, version)
+            if entry is _MISSING:
+                pending.setdefault(key, []).append(description)
+            else:
+                found[description] = entry
+
+        if pending:
+            for key, entry in self._fetch(user_id, list(pending), version).items():
+                for description in pending[key]:
+                    found[description] = entry
+        return found
+
+    def _fetch(self, user_id: str, keys: List[str],
+               version: str) -> Dict[str, Tuple[str, Optional[float]]]:
+        query = """
+            SELECT user_id, description_key, category, confidence
+            FROM expense_insights.category_cache
+            WHERE description_key IN ({placeholders})
+            AND ((user_id = %s AND config_version = %s)
+                 OR (user_id = %s AND config_version = %s))
+        """
+        resolved = {}
+        try:
+            db, cursor = get_db()
+            for i in range(0, len(keys), self.lookup_chunk_size):
+                chunk = keys[i:i + self.lookup_chunk_size]
+                cursor.execute(
+                    query.format(placeholders=", ".join(["%s"] * len(chunk))),
+                    (*chunk, user_id, ANY_VERSION, GLOBAL_USER, version))
+                overrides, globals_ = {}, {}
+                for row_user, key, category, confidence in cursor.fetchall():
+                    if row_user == GLOBAL_USER:
+                        globals_[key] = (category, confidence)
+                    else:
+                        overrides[key] = (category, confidence)
+
+                for key in chunk:
+                    self._put((user_id, ANY_VERSION, key), overrides.get(key, _NO_OVERRIDE))
+                    if key in globals_:
+                        self._put((GLOBAL_USER, version, key), globals_[key])
+                    entry = overrides.get(key, globals_.get(key))
+                    if entry is not None:
+                        resolved[key] = entry
+        except Exception as e:
+            print(f"Error reading category cache: {e}")
+        return resolved
+
+    def store(self, results: Dict[str, str], version: str,
+              confidences: Optional[Dict[str, float]] = None) -> None:
+        """
+        Store classifier results as global entries for a classifier version.
+
+        Args:
+            results: Dictionary mapping descriptions to categories
+            version: Classifier version that produced the results
+            confidences: Dictionary mapping descriptions to the classifier's confidence
+        """
+        confidences = confidences or {}
+        entries = {}
+        for description, category in results.items():
+            if category:
+                confidence = confidences.get(description)
+                entries[canonicalize_description(description)] = (
+                    category, None if confidence is None else float(confidence))
+        if not entries:
+            return
+
+        for key, entry in entries.items():
+            self._put((GLOBAL_USER, version, key), entry)
+        self._upsert([(GLOBAL_USER, key, version, *entry) for key, entry in entries.items()])
+
+    def set_override(self, user_id: str, description: str, category: str) -> None:
+        """
+        Pin a category for one user's description, regardless of classifier version.
+
+        Args:
+            user_id: The user the override belongs to
+            description: Raw transaction description
+            category: The category to always return for this user
+        """
+        key = canonicalize_description(description)
+        self._put((user_id, ANY_VERSION, key), (category, OVERRIDE_CONFIDENCE))
+        self._upsert([(user_id, key, ANY_VERSION, category, OVERRIDE_CONFIDENCE)])
+
+    def _upsert(self, rows):
+        query = """
+            INSERT INTO expense_insights.category_cache
+            (user_id, description_key, config_version, category, confidence, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE category = VALUES(category),
+                                    confidence = VALUES(confidence),
+                                    updated_at = VALUES(updated_at)
+        """
+        db, cursor = None, None
+        try:
+            db, cursor = get_db()
+            now = datetime.datetime.now().replace(microsecond=0)
+            cursor.executemany(query, [(*row, now) for row in rows])
+            db.commit()
+        except Exception as e:
+            print(f"Error writing category cache: {e}")
+            if db:
+                db.rollback()
+
+
+description_cache = DescriptionCache()
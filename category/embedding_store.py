@@ -0,0 +1,180 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, List
+import numpy as np
+
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "embedding_store")
+# float16 halves the file and the mapped pages; float32 keeps full precision
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float16")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# Every line of hashes.txt is one hex digest and a newline
+_HASH_LINE_BYTES = len(text_hash("")) + 1
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding cache for one embedding model, keyed by text hash.
+
+    Vectors live in a flat, append-only `embeddings.bin` file opened with
+    memory mapping, so startup reads no vectors up front and only new texts
+    are ever encoded. `hashes.txt` holds the text hash of each row, one
+    fixed-length line per row, and `meta.json` the vector size and dtype.
+    Adding texts appends to both files, so its cost depends on the new
+    texts only, not on the size of the store. Returned embeddings are
+    float32 copies; the store saves encoding time, not memory.
+
+    Several processes (the service, train_head.py, benchmark.py) can share
+    a store. Appends hold an exclusive flock on the `lock` file, and each
+    one first reads the rows other processes appended, so row numbers
+    always match the files.
+    """
+
+    def __init__(self, model_name: str, store_dir: str = EMBEDDING_STORE_DIR,
+                 dtype: str = EMBEDDING_STORE_DTYPE):
+        self.directory = os.path.join(store_dir, model_name.replace("/", "__"))
+        self.dtype = np.dtype(dtype)
+        self._vectors_path = os.path.join(self.directory, "embeddings.bin")
+        self._hashes_path = os.path.join(self.directory, "hashes.txt")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock_path = os.path.join(self.directory, "lock")
+        self._lock = threading.Lock()
+        self._load()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Hold the store's exclusive lock across processes."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._lock_path, "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _reset(self):
+        self._rows = {}
+        self._size = 0
+        self._dim = None
+        self._vectors = None
+
+    def _load(self):
+        self._reset()
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with self._file_lock():
+                self._read_meta()
+                self._sync()
+            self._map()
+        except Exception as e:
+            print(f"Ignoring unreadable embedding store {self.directory}: {e}")
+            self._reset()
+
+    def _read_meta(self):
+        with open(self._meta_path, "r") as file:
+            meta = json.load(file)
+        if np.dtype(meta["dtype"]) != self.dtype:
+            raise ValueError(f"stored as {meta['dtype']}, expected {self.dtype}")
+        self._dim = int(meta["dim"])
+
+    def _committed_rows(self) -> int:
+        """
+        Count the rows present in both files, dropping any half-written append.
+
+        A writer that crashed between or during its two appends leaves rows
+        without a hash (or a partial line); both files are cut back to the
+        rows they share. Call with the file lock held.
+        """
+        row_bytes = self._dim * self.dtype.itemsize
+        vectors_size = os.path.getsize(self._vectors_path)
+        hashes_size = os.path.getsize(self._hashes_path)
+        size = min(vectors_size // row_bytes, hashes_size // _HASH_LINE_BYTES)
+        if vectors_size != size * row_bytes:
+            os.truncate(self._vectors_path, size * row_bytes)
+        if hashes_size != size * _HASH_LINE_BYTES:
+            os.truncate(self._hashes_path, size * _HASH_LINE_BYTES)
+        return size
+
+    def _sync(self):
+        """Read the hashes of rows appended since the last read; call with the file lock held."""
+        size = self._committed_rows()
+        if size <= self._size:
+            return
+        with open(self._hashes_path, "r") as file:
+            file.seek(self._size * _HASH_LINE_BYTES)
+            hashes = file.read((size - self._size) * _HASH_LINE_BYTES).split()
+        for row, h in enumerate(hashes, start=self._size):
+            self._rows[h] = row
+        self._size = size
+
+    def _map(self):
+        self._vectors = (np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                   shape=(self._size, self._dim))
+                         if self._size else None)
+
+    def get_or_encode(self, texts: List[str],
+                      encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return embeddings for texts, encoding and storing only the ones not on disk.
+
+        Args:
+            texts: Texts to embed
+            encode: Function that encodes a list of texts into unit-length vectors
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            missing = list(dict.fromkeys(
+                (h, text) for h, text in zip(hashes, texts) if h not in self._rows))
+            if missing and self._dim is not None:
+                # Other processes may have stored some of them since the last read
+                with self._file_lock():
+                    self._sync()
+                self._map()
+                missing = [(h, text) for h, text in missing if h not in self._rows]
+            if missing:
+                self._append([h for h, _ in missing], encode([text for _, text in missing]))
+            if not texts:
+                return np.zeros((0, 0), dtype=np.float32)
+            rows = [self._rows[h] for h in hashes]
+            return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def _append(self, hashes: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        with self._file_lock():
+            if self._dim is None:
+                if os.path.exists(self._meta_path):
+                    # Another process created the store since this one loaded
+                    self._read_meta()
+                else:
+                    for path in (self._vectors_path, self._hashes_path):
+                        open(path, "wb").close()
+                    with open(self._meta_path, "w") as file:
+                        json.dump({"dim": vectors.shape[1], "dtype": self.dtype.name}, file)
+                    self._dim = vectors.shape[1]
+            self._sync()
+
+            # Another process may have stored some of these texts meanwhile
+            new = [i for i, h in enumerate(hashes) if h not in self._rows]
+            if new:
+                # Vectors first: a crash before the hashes are written only
+                # leaves unreferenced rows, which the next writer truncates
+                with open(self._vectors_path, "ab") as file:
+                    file.write(vectors[new].tobytes())
+                with open(self._hashes_path, "a") as file:
+                    file.write("".join(f"{hashes[i]}\n" for i in new))
+                for i in new:
+                    self._rows[hashes[i]] = self._size
+                    self._size += 1
+        self._map()
@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # brute force only
+    hnswlib = None
+
+
+class ExampleIndex:
+    """
+    Incremental nearest-neighbour index over unit-length example embeddings.
+
+    Examples are keyed (by canonical transaction text), so adding a key that
+    already exists overrides its category without encoding it again. Removed
+    examples are tombstoned and compacted away once they pile up. Small
+    indexes are searched exactly with one matrix product and a partial
+    top-k selection. Once the live count passes `ann_threshold`, an HNSW
+    graph (hnswlib) is built and searched instead.
+
+    Not thread-safe; callers serialize access.
+    """
+
+    def __init__(self, ann_threshold: int = 5000, ann_ef: int = 100):
+        """
+        Args:
+            ann_threshold: Number of live examples above which the HNSW graph is used
+            ann_ef: HNSW search breadth; higher is more accurate and slower
+        """
+        self.ann_threshold = ann_threshold
+        self.ann_ef = ann_ef
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._category_index = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._rows: Dict[str, int] = {}
+        self._ann = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def _grow(self, needed: int, dim: int):
+        capacity = len(self._embeddings)
+        if self._size + needed <= capacity:
+            return
+        new_capacity = max(2 * capacity, self._size + needed, 64)
+        embeddings = np.zeros((new_capacity, dim), dtype=np.float32)
+        if self._size:
+            embeddings[:self._size] = self._embeddings[:self._size]
+        category_index = np.zeros(new_capacity, dtype=np.int64)
+        category_index[:self._size] = self._category_index[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._embeddings, self._category_index, self._alive = embeddings, category_index, alive
+        if self._ann is not None:
+            self._ann.resize_index(new_capacity)
+
+    def set_category(self, key: str, category_index: int) -> bool:
+        """Override the category of an existing example; returns False if the key is unknown."""
+        row = self._rows.get(key)
+        if row is None:
+            return False
+        self._category_index[row] = category_index
+        return True
+
+    def add(self, keys: List[str], embeddings: np.ndarray, category_indices: List[int]):
+        """
+        Append new examples. Keys must not already be in the index.
+
+        Args:
+            keys: Canonical transaction texts
+            embeddings: Unit-length embeddings of shape (len(keys), dim)
+            category_indices: Category position of each example
+        """
+        if not keys:
+            return
+        self._grow(len(keys), embeddings.shape[1])
+        start, end = self._size, self._size + len(keys)
+        self._embeddings[start:end] = embeddings
+        self._category_index[start:end] = category_indices
+        self._alive[start:end] = True
+        self._size = end
+        for offset, key in enumerate(keys):
+            self._rows[key] = start + offset
+
+        if self._ann is not None:
+            self._ann.add_items(embeddings, np.arange(start, end))
+        elif hnswlib is not None and len(self._rows) > self.ann_threshold:
+            self._build_ann()
+
+    def remove(self, keys: List[str]):
+        """Remove examples by key; unknown keys are ignored."""
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is None:
+                continue
+            self._alive[row] = False
+            if self._ann is not None:
+                self._ann.mark_deleted(row)
+
+        # Reclaim space once most rows are dead
+        if self._size > 64 and len(self._rows) < self._size // 2:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        row_to_key = {row: key for key, row in self._rows.items()}
+        self._embeddings = self._embeddings[keep].copy()
+        self._category_index = self._category_index[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._size = len(keep)
+        self._rows = {row_to_key[row]: new_row for new_row, row in enumerate(keep)}
+        self._ann = None
+        if hnswlib is not None and len(self._rows) > self.ann_threshold:
+            self._build_ann()
+
+    def _build_ann(self):
+        dim = self._embeddings.shape[1]
+        ann = hnswlib.Index(space="ip", dim=dim)
+        ann.init_index(max_elements=len(self._embeddings), ef_construction=200, M=16)
+        live = np.flatnonzero(self._alive[:self._size])
+        ann.add_items(self._embeddings[live], live)
+        ann.set_ef(self.ann_ef)
+        self._ann = ann
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar live examples for each query.
+
+        Args:
+            queries: Unit-length query embeddings of shape (n, dim)
+            k: Number of neighbours; capped at the number of live examples
+
+        Returns:
+            (similarities, category_indices), both of shape (n, k)
+        """
+        k = min(k, len(self._rows))
+        if k == 0 or len(queries) == 0:
+            return (np.zeros((len(queries), 0), dtype=np.float32),
+                    np.zeros((len(queries), 0), dtype=np.int64))
+
+        if self._ann is not None:
+            self._ann.set_ef(max(self.ann_ef, k))
+            rows, distances = self._ann.knn_query(queries, k=k)
+            # hnswlib's inner-product distance is 1 - dot product
+            return 1.0 - distances, self._category_index[rows.astype(np.int64)]
+
+        similarities = queries @ self._embeddings[:self._size].T
+        similarities[:, ~self._alive[:self._size]] = -np.inf
+        # Top-k per row without a full sort
+        rows = np.argpartition(similarities, -k, axis=1)[:, -k:]
+        return (np.take_along_axis(similarities, rows, axis=1),
+                self._category_index[rows])
+
+    def category_max_similarity(self, queries: np.ndarray, num_categories: int,
+                                k: int = 50) -> np.ndarray:
+        """
+        Best similarity per category among each query's k nearest examples.
+
+        Returns:
+            Array of shape (n, num_categories); categories without a
+            neighbour in the top k get -1
+        """
+        scores = np.full((len(queries), num_categories), -1.0, dtype=np.float32)
+        similarities, category_indices = self.search(queries, k)
+        if similarities.size:
+            rows = np.repeat(np.arange(len(queries)), similarities.shape[1])
+            np.maximum.at(scores, (rows, category_indices.ravel()), similarities.ravel())
+        return scores
+
+    def max_similarity(self, queries: np.ndarray) -> np.ndarray:
+        """Similarity of each query to its closest example (0 when the index is empty)."""
+        similarities, _ = self.search(queries, 1)
+        if not similarities.size:
+            return np.zeros(len(queries), dtype=np.float32)
+        return similarities[:, 0]
+
+    def lookup(self, key: str) -> Optional[int]:
+        """Return the category index of an exact key, or None."""
+        row = self._rows.get(key)
+        return None if row is None else int(self._category_index[row])
@@ -0,0 +1,74 @@
+import datetime
+from typing import Dict, List
+from db import get_db
+from normalization import canonicalize_description
+
+
+class ExampleStore:
+    """
+    Persistent few-shot examples added at runtime through POST /examples.
+
+    Examples are keyed by canonical transaction text in the
+    `classifier_examples` table, so feeding the same correction twice
+    updates its category. They are loaded into the classifier at startup,
+    after the config examples, so they survive restarts.
+    """
+
+    def load(self) -> List[Dict[str, str]]:
+        """
+        Read every stored example, oldest first, so later corrections win.
+
+        Returns:
+            List of dictionaries with 'transaction' and 'category' keys
+        """
+        try:
+            db, cursor = get_db()
+            cursor.execute("""
+                SELECT transaction_text, category
+                FROM expense_insights.classifier_examples
+                ORDER BY updated_at, description_key
+            """)
+            return [{"transaction": transaction, "category": category}
+                    for transaction, category in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error reading runtime examples: {e}")
+            return []
+
+    def save(self, examples: List[Dict[str, str]]) -> None:
+        """Insert or update examples; raises if they could not be saved."""
+        now = datetime.datetime.now().replace(microsecond=0)
+        rows = {canonicalize_description(example["transaction"]):
+                (example["transaction"], example["category"]) for example in examples}
+        if not rows:
+            return
+        self._write("""
+            INSERT INTO expense_insights.classifier_examples
+            (description_key, transaction_text, category, updated_at)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE transaction_text = VALUES(transaction_text),
+                                    category = VALUES(category),
+                                    updated_at = VALUES(updated_at)
+        """, [(key, transaction, category, now)
+              for key, (transaction, category) in rows.items()])
+
+    def remove(self, transactions: List[str]) -> None:
+        """Delete examples by transaction text; raises if they could not be deleted."""
+        keys = {canonicalize_description(transaction) for transaction in transactions}
+        if not keys:
+            return
+        self._write("DELETE FROM expense_insights.classifier_examples WHERE description_key = %s",
+                    [(key,) for key in keys])
+
+    def _write(self, query, rows):
+        db, cursor = None, None
+        try:
+            db, cursor = get_db()
+            cursor.executemany(query, rows)
+            db.commit()
+        except Exception:
+            if db:
+                db.rollback()
+            raise
+
+
+example_store = ExampleStore()
@@ -1,16 +1,34 @@
+import hashlib
 import json
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 import yaml
 import numpy as np
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer, util
+from inference_backend import INFERENCE_BACKEND, load_sentence_model, load_zero_shot_pipeline
+from classification_head import ClassificationHead
+from embedding_store import EMBEDDING_STORE_DIR, EmbeddingStore
+from example_index import ExampleIndex
+from keyword_matcher import KeywordMatcher, load_merchant_keywords
+from normalization import canonicalize_description
+from profiler import Profiler, metrics
+from scoring import combine_scores, confidence_scores, rerank
+
+CLASSIFY_MODES = ("hybrid", "cascade")
+# The zero-shot pipeline's default template; premise-hypothesis pairs are
+# built the same way, so scores match the pipeline's
+HYPOTHESIS_TEMPLATE = "This example is {}."
+# Fingerprint entry of the settings that only weigh stored score vectors;
+# the leading "*" keeps it apart from category names
+WEIGHTS_FINGERPRINT = "*weights"
 
 
 class ExpenseClassifier:
     def __init__(self, config_path: str,
                  classification_model: str = "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli",
-                 embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"):
+                 embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 registry=None,
+                 backend: str = INFERENCE_BACKEND):
         """
         Initialize the enhanced expense classifier with configuration from a file.
 
@@ -18,24 +36,69 @@ class ExpenseClassifier:
             config_path: Path to the configuration file (YAML or JSON)
             classification_model: Name of the Hugging Face model for zero-shot classification
             embedding_model: Name of the Hugging Face model for embeddings (few-shot learning)
+            registry: Optional ModelRegistry to take shared models and inference locks from
+            backend: "torch" for eager PyTorch, "onnx" for int8-quantized ONNX Runtime
         """
         self.config = self._load_config(config_path)
         self.categories = self.config.get("categories", [])
         self.rules = self.config.get("rules", {})
         self.examples = self.config.get("examples", [])
-
-        # Initialize the classification pipeline
-        self.classifier = pipeline(
-            "zero-shot-classification",
-            model=classification_model,
-            device=-1  # Use CPU; set to GPU index if available
-        )
-
-        # Initialize the sentence transformer for few-shot learning
-        self.sentence_model = SentenceTransformer(embedding_model)
-
-        # Pre-compute embeddings for examples
+        self.settings = self.config.get("classifier") or {}
+        # Number of candidate categories sent to zero-shot NLI; 0 sends all of them
+        self.prune_top_k = int(self.settings.get("prune_top_k", 0))
+        # "hybrid" always runs NLI; "cascade" skips it when the kNN vote is decisive
+        self.mode = self.settings.get("mode", "hybrid")
+        if self.mode not in CLASSIFY_MODES:
+            raise ValueError(f"Classifier mode must be one of {CLASSIFY_MODES}")
+        self.cascade_min_confidence = float(self.settings.get("cascade_min_confidence", 0.8))
+        self.cascade_min_margin = float(self.settings.get("cascade_min_margin", 0.5))
+        self.cascade_min_similarity = float(self.settings.get("cascade_min_similarity", 0.6))
+        self.few_shot_weight = float(self.settings.get("few_shot_weight", 0.7))
+        # Premise-hypothesis pairs per NLI forward pass, however many
+        # descriptions a classify call brings
+        self.nli_batch_size = int(self.settings.get("nli_batch_size", 32))
+        # Attach the zero-shot and few-shot score vectors to NLI results
+        self.keep_scores = bool(self.settings.get("keep_scores", False))
+        self.classification_model = classification_model
+        self.embedding_model = embedding_model
+        self.backend = backend
+
+        if registry is not None:
+            # Shared models: loaded once per process, inference serialized per model
+            self.classifier = registry.get_zero_shot_pipeline(classification_model, backend)
+            self.sentence_model = registry.get_sentence_model(embedding_model, backend)
+            self._classifier_lock = registry.inference_lock(classification_model, backend)
+            self._sentence_lock = registry.inference_lock(embedding_model, backend)
+        else:
+            # Initialize the classification pipeline
+            self.classifier = load_zero_shot_pipeline(classification_model, backend)
+
+            # Initialize the sentence transformer for few-shot learning
+            self.sentence_model = load_sentence_model(embedding_model, backend)
+            self._classifier_lock = threading.Lock()
+            self._sentence_lock = threading.Lock()
+
+        # Stage timings, batch sizes and NLI token counts; also fed into the
+        # process-wide metrics
+        self.profiler = Profiler(parent=metrics)
+
+        # Example and rule embeddings persisted across restarts; quantized
+        # models embed differently, so each backend has its own store
+        self.embedding_store = (
+            EmbeddingStore(f"{embedding_model}-{backend}") if EMBEDDING_STORE_DIR else None)
+
+        # Guards the example index, which add_examples and remove_examples update
+        self._examples_lock = threading.RLock()
+        self.example_index = ExampleIndex(
+            ann_threshold=int(self.settings.get("ann_threshold", 5000)))
+
+        # Compile merchant keywords and pre-compute embeddings for examples and category rules
+        self._prepare_keyword_matcher(config_path)
         self._prepare_example_embeddings()
+        self._prepare_category_embeddings()
+        self._load_head(config_path)
+        self.version = self._compute_version()
+        self.score_version = self._compute_score_version()
 
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load configuration from YAML or JSON file."""
@@ -50,19 +113,225 @@ class ExpenseClassifier:
             else:
                 raise ValueError("Config file must be YAML or JSON")
 
+    def _compute_version(self) -> str:
+        """
+        Fingerprint the models and configuration that decide a category.
+
+        Returns:
+            A short hash that changes whenever categories, rules, examples
+            or models change
+        """
+        fingerprint = json.dumps(self.category_fingerprints(), sort_keys=True)
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+    def _compute_score_version(self) -> str:
+        """
+        Fingerprint what the zero-shot and few-shot score vectors depend on.
+
+        Weights and thresholds are left out, so score vectors stored under
+        this version can be re-ranked after those change.
+
+        Returns:
+            A short hash of the models, categories, rules, examples and pruning
+        """
+        fingerprint = json.dumps({
+            "classification_model": self.classification_model,
+            "embedding_model": self.embedding_model,
+            "backend": self.backend,
+            "categories": self.categories,
+            "rules": {category: self.rules.get(category.lower()) for category in self.categories},
+            "examples": [(example.get("transaction"), example.get("category"))
+                         for example in self.examples],
+            "hypothesis_template": HYPOTHESIS_TEMPLATE,
+            "prune_top_k": self.prune_top_k,
+        }, sort_keys=True)
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+    def category_fingerprints(self) -> Dict[str, str]:
+        """
+        Fingerprint the configuration of each category separately.
+
+        Comparing the fingerprints of two versions tells which categories
+        changed between them. The "" entry covers everything shared by all
+        categories (models, backend, the category list and the settings that
+        decide results); when it differs, every category is affected. The
+        WEIGHTS_FINGERPRINT entry covers the weights applied to the score
+        vectors; when only it differs, stored vectors can be re-ranked.
+
+        Returns:
+            Dictionary mapping "", WEIGHTS_FINGERPRINT and each category name
+            to a short hash
+        """
+        def digest(value) -> str:
+            encoded = json.dumps(value, sort_keys=True).encode("utf-8")
+            return hashlib.sha256(encoded).hexdigest()[:16]
+
+        fingerprints = {"": digest({
+            "classification_model": self.classification_model,
+            "embedding_model": self.embedding_model,
+            "backend": self.backend,
+            "categories": self.categories,
+            "settings": self._result_settings(),
+        }), WEIGHTS_FINGERPRINT: digest({"few_shot_weight": self.few_shot_weight})}
+        for category in self.categories:
+            fingerprints[category] = digest({
+                "rule": self.rules.get(category.lower()),
+                "examples": [example.get("transaction") for example in self.examples
+                             if example.get("category") == category],
+                "merchant_keywords": sorted(
+                    keyword for keyword, keyword_category in self.merchant_keywords.items()
+                    if keyword_category == category),
+            })
+        return fingerprints
+
+    def _result_settings(self) -> Dict[str, Any]:
+        """
+        The classifier settings that decide which category a description gets.
+
+        Batch sizes, index tuning, keep_scores and file locations only
+        change how fast results come or where they are kept, so they are
+        left out. Merchant keywords are fingerprinted per category and the
+        few-shot weight under WEIGHTS_FINGERPRINT instead.
+        """
+        settings = {
+            "mode": self.mode,
+            "prune_top_k": self.prune_top_k,
+            "hypothesis_template": HYPOTHESIS_TEMPLATE,
+            "head": self.head.version if self.head is not None else None,
+        }
+        if self.head is not None:
+            settings["head_min_confidence"] = self.head_min_confidence
+        # Hybrid mode never reads the cascade thresholds
+        if self.mode == "cascade":
+            settings.update(cascade_min_confidence=self.cascade_min_confidence,
+                            cascade_min_margin=self.cascade_min_margin,
+                            cascade_min_similarity=self.cascade_min_similarity)
+        return settings
+
+    def _prepare_keyword_matcher(self, config_path: str):
+        """Compile the config and user merchant keywords into one matcher."""
+        merchant_list = self.settings.get("merchant_list")
+        if merchant_list:
+            merchant_list = os.path.join(os.path.dirname(config_path), merchant_list)
+
+        # Merchant sections are keyed by lower-case category, like rules
+        category_names = {category.lower(): category for category in self.categories}
+        self.merchant_keywords = {
+            keyword: category_names[category.lower()]
+            for keyword, category in load_merchant_keywords(
+                self.config.get("merchants"), merchant_list).items()
+            if category.lower() in category_names
+        }
+        self.keyword_matcher = (KeywordMatcher(self.merchant_keywords)
+                                if self.merchant_keywords else None)
+
+    def _load_head(self, config_path: str):
+        """Load the trained classification head named in the settings, if it fits this classifier."""
+        self.head = None
+        self.head_min_confidence = float(self.settings.get("head_min_confidence", 0.9))
+        head_path = self.settings.get("head")
+        if not head_path:
+            return
+
+        head_path = os.path.join(os.path.dirname(config_path), head_path)
+        try:
+            head = ClassificationHead.load(head_path)
+        except Exception as e:
+            print(f"Ignoring classification head {head_path}: {e}")
+            return
+        if (head.categories != self.categories or head.embedding_model != self.embedding_model
+                or head.backend != self.backend):
+            print(f"Ignoring classification head {head_path}: trained for other "
+                  f"categories, embedding model or backend")
+            return
+        self.head = head
+
     def _prepare_example_embeddings(self):
         """Pre-compute embeddings for all examples for faster few-shot learning."""
-        if not self.examples:
-            self.example_embeddings = []
-            self.example_categories = []
+        self._index_examples(self.examples)
+
+    def _index_examples(self, examples: List[Dict[str, str]]) -> bool:
+        """
+        Add examples to the index, encoding only texts it has not seen.
+
+        Examples whose canonical text is already indexed only have their
+        category overridden; later entries win over earlier ones.
+
+        Returns:
+            True if any example was added or changed
+        """
+        new_examples = {}
+        changed = False
+        for example in examples:
+            if example.get('category') not in self.categories or 'transaction' not in example:
+                continue
+            key = canonicalize_description(example['transaction'])
+            category_index = self.categories.index(example['category'])
+            if key in self.example_index:
+                changed |= self.example_index.set_category(key, category_index)
+            else:
+                new_examples[key] = (example['transaction'], category_index)
+
+        if new_examples:
+            keys = list(new_examples)
+            texts = [new_examples[key][0] for key in keys]
+            # Unit-length embeddings, so a dot product is the cosine similarity
+            embeddings = self._encode_stored(texts)
+            self.example_index.add(keys, embeddings, [new_examples[key][1] for key in keys])
+            changed = True
+        return changed
+
+    def _prepare_category_embeddings(self):
+        """Pre-compute embeddings of each category's name and rule text for pruning."""
+        category_texts = []
+        for category in self.categories:
+            rule = self.rules.get(category.lower())
+            category_texts.append(f"{category}: {rule}" if rule else category)
+
+        if not category_texts:
+            self.category_embeddings = np.zeros((0, 0), dtype=np.float32)
             return
 
-        # Extract text and categories from examples
-        example_texts = [example['transaction'] for example in self.examples]
-        self.example_categories = [example['category'] for example in self.examples]
+        self.category_embeddings = self._encode_stored(category_texts)
+
+    def _encode(self, transactions: List[str]) -> np.ndarray:
+        """Encode transactions into unit-length embeddings in one model call."""
+        with self.profiler.stage("embedding"), self._sentence_lock:
+            return self.sentence_model.encode(
+                transactions, convert_to_numpy=True, normalize_embeddings=True)
 
-        # Calculate embeddings
-        self.example_embeddings = self.sentence_model.encode(example_texts)
+    def _encode_stored(self, texts: List[str]) -> np.ndarray:
+        """Encode config texts through the on-disk store, so restarts only encode new ones."""
+        if self.embedding_store is None:
+            return self._encode(texts)
+        return self.embedding_store.get_or_encode(texts, self._encode)
+
+    def _candidate_categories(self, embeddings: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Pick the most plausible categories for each transaction by embedding similarity.
+
+        A category scores the higher of its similarity to the category rule
+        text and its similarity to the closest example of that category
+        among the transaction's nearest examples.
+
+        Args:
+            embeddings: Unit-length transaction embeddings of shape (batch, dim)
+            top_k: Number of candidate categories to keep per transaction
+
+        Returns:
+            Boolean mask of shape (batch, categories) marking the candidates
+        """
+        with self._examples_lock:
+            category_embeddings = self.category_embeddings
+            example_scores = self.example_index.category_max_similarity(
+                embeddings, len(self.categories))
+
+        scores = np.maximum(embeddings @ category_embeddings.T, example_scores)
+
+        top = np.argpartition(scores, -top_k, axis=1)[:, -top_k:]
+        mask = np.zeros(scores.shape, dtype=bool)
+        np.put_along_axis(mask, top, True, axis=1)
+        return mask
 
     def _prepare_hypotheses(self) -> List[str]:
         """
@@ -84,9 +353,51 @@ class ExpenseClassifier:
                 hypothesis += f" ({self.rules[rule_key]})"
 
             hypotheses.append(hypothesis)
-        print("hypothseses",hypotheses )
         return hypotheses
 
+    def _few_shot_scores(self, transactions: List[str], k: int = 5,
+                         embeddings: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Score a batch of transactions against the examples in one pass.
+
+        The whole batch is encoded at once and searched in the example index in
+        one call. The similarities of each row's top-k examples are then
+        scatter-added into their categories.
+
+        Args:
+            transactions: Transaction texts to classify
+            k: Number of nearest neighbors to consider
+            embeddings: Already computed unit-length embeddings of the transactions
+
+        Returns:
+            Array of shape (len(transactions), len(categories)) with each row
+            normalized to sum to 1, or all zeros when there are no examples
+        """
+        scores = np.zeros((len(transactions), len(self.categories)), dtype=np.float32)
+        if not transactions or not len(self.example_index):
+            return scores
+
+        if embeddings is None:
+            embeddings = self._encode(transactions)
+
+        # Top-k similarities per row, from the exact or approximate index
+        with self._examples_lock:
+            top_similarities, top_categories = self.example_index.search(embeddings, k)
+
+        # Weight each neighbour's category by its similarity
+        rows = np.repeat(np.arange(len(transactions)), top_similarities.shape[1])
+        np.add.at(scores, (rows, top_categories.ravel()), top_similarities.ravel())
+
+        # Normalize scores
+        totals = scores.sum(axis=1, keepdims=True)
+        np.divide(scores, totals, out=scores, where=totals > 0)
+        return scores
+
+    def _nearest_similarity(self, embeddings: np.ndarray) -> np.ndarray:
+        """Return each transaction's cosine similarity to its closest example."""
+        with self._examples_lock:
+            return self.example_index.max_similarity(embeddings)
+
     def _few_shot_classify(self, transaction: str, k: int = 5) -> Dict[str, float]:
         """
         Classify a transaction using few-shot learning by comparing to examples.
@@ -98,39 +409,153 @@ class ExpenseClassifier:
         Returns:
             Dictionary mapping categories to confidence scores
         """
-        if not self.example_embeddings.any():
-            return {}
+        scores = self._few_shot_scores([transaction], k)[0]
+        return {category: float(score)
+                for category, score in zip(self.categories, scores) if score > 0}
+
+    def _zero_shot_scores(self, results: List[Dict[str, Any]],
+                          hypotheses: List[str]) -> np.ndarray:
+        """
+        Arrange zero-shot pipeline results into a (batch x categories) matrix.
+
+        Args:
+            results: Pipeline outputs, one per transaction
+            hypotheses: The hypotheses the pipeline was called with
+
+        Returns:
+            Array of zero-shot scores in category order
+        """
+        hypothesis_index = {hypothesis: idx for idx, hypothesis in enumerate(hypotheses)}
+        scores = np.zeros((len(results), len(self.categories)), dtype=np.float32)
+        for row, result in enumerate(results):
+            for label, score in zip(result['labels'], result['scores']):
+                scores[row, hypothesis_index[label]] = score
+        return scores
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count of each text under the NLI tokenizer (word count if it has none)."""
+        tokenizer = getattr(self.classifier, "tokenizer", None)
+        if tokenizer is None or not texts:
+            return [len(text.split()) for text in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def padding_stats(self) -> Dict[str, float]:
+        """
+        Token usage of the NLI forward passes so far.
 
-        # Get embedding for the transaction
-        transaction_embedding = self.sentence_model.encode(transaction)
+        Returns:
+            Dictionary with 'tokens' (real tokens), 'padded_tokens' (tokens
+            after padding each batch to its longest pair) and 'padding_ratio'
+            (share of the padded tokens that were padding)
+        """
+        snapshot = self.profiler.snapshot()
+        tokens = snapshot["counters"].get("nli_tokens", 0)
+        padded = snapshot["counters"].get("nli_padded_tokens", 0)
+        return {"tokens": tokens, "padded_tokens": padded,
+                "padding_ratio": 1 - tokens / padded if padded else 0.0}
 
-        # Calculate cosine similarities
-        similarities = util.cos_sim(transaction_embedding, self.example_embeddings)[0]
+    def _entailment_logits(self, premises: List[str], hypotheses: List[str]) -> np.ndarray:
+        """
+        Run premise-hypothesis pairs through the NLI model in one padded forward pass.
 
-        # Get top-k most similar examples
-        if k > len(similarities):
-            k = len(similarities)
+        Returns:
+            The entailment logit of each pair
+        """
+        import torch
+
+        inputs = self.classifier.tokenizer(premises, hypotheses, padding=True,
+                                           truncation="only_first", return_tensors="pt")
+        attention_mask = inputs["attention_mask"]
+        self.profiler.count("nli_batches")
+        self.profiler.count("nli_pairs", len(premises))
+        self.profiler.count("nli_tokens", int(attention_mask.sum()))
+        self.profiler.count("nli_padded_tokens", int(attention_mask.numel()))
+        with self.profiler.stage("nli"), self._classifier_lock, torch.no_grad():
+            logits = self.classifier.model(**inputs).logits
+        return logits[:, self.classifier.entailment_id].float().numpy()
+
+    def _zero_shot_batch(self, batch: List[str], hypotheses: List[str],
+                         candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Run zero-shot classification for a batch of transactions.
 
-        top_k_indices = np.argsort(similarities)[-k:]
+        Every transaction is paired with each of its candidate hypotheses,
+        so transactions with different candidate sets share forward passes.
+        The pairs are sorted by token length and run `nli_batch_size` at a
+        time, so each pass is only padded to pairs of similar length. As in
+        the pipeline with multi_label=False, entailment logits are softmaxed
+        over each transaction's candidates.
 
-        # Count categories of most similar examples
-        category_scores = {}
-        for idx in top_k_indices:
-            category = self.example_categories[idx]
-            similarity = similarities[idx].item()
+        Args:
+            batch: Transaction texts
+            hypotheses: One hypothesis per category
+            candidates: Optional (batch, categories) mask; each transaction is
+                only scored against its candidate hypotheses
+
+        Returns:
+            Zero-shot scores of shape (batch, categories); pruned categories score 0
+        """
+        if candidates is None:
+            candidates = np.ones((len(batch), len(hypotheses)), dtype=bool)
+        rows, columns = np.nonzero(candidates)
+        scores = np.zeros(candidates.shape, dtype=np.float32)
+        if not len(rows):
+            return scores
+
+        pair_hypotheses = [HYPOTHESIS_TEMPLATE.format(hypothesis) for hypothesis in hypotheses]
+        pair_lengths = (np.array(self._token_lengths(batch))[rows]
+                        + np.array(self._token_lengths(pair_hypotheses))[columns])
+        order = np.argsort(pair_lengths, kind="stable")
+
+        entailment = np.full(candidates.shape, -np.inf, dtype=np.float32)
+        for i in range(0, len(order), self.nli_batch_size):
+            pairs = order[i:i + self.nli_batch_size]
+            entailment[rows[pairs], columns[pairs]] = self._entailment_logits(
+                [batch[row] for row in rows[pairs]],
+                [pair_hypotheses[column] for column in columns[pairs]])
+        entailment -= entailment.max(axis=1, keepdims=True)
+        np.exp(entailment, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def _combine_scores(self, zero_shot: np.ndarray, few_shot: np.ndarray) -> np.ndarray:
+        """
+        Combine zero-shot and few-shot score matrices (simple weighted average).
 
-            # Weight by similarity
-            if category not in category_scores:
-                category_scores[category] = 0
-            category_scores[category] += similarity
+        Args:
+            zero_shot: Zero-shot scores of shape (batch, categories)
+            few_shot: Few-shot scores of shape (batch, categories)
 
-        # Normalize scores
-        total = sum(category_scores.values())
-        if total > 0:
-            for category in category_scores:
-                category_scores[category] /= total
+        Returns:
+            Combined scores of shape (batch, categories)
+        """
+        return combine_scores(zero_shot, few_shot, self._weight_in_use())
+
+    def _weight_in_use(self) -> float:
+        # Give more weight to few-shot if we have examples
+        return self.few_shot_weight if len(self.example_index) else 0.0
+
+    def rerank(self, scores: List[Tuple[np.ndarray, np.ndarray]]) -> List[Dict[str, Any]]:
+        """
+        Decide categories again from stored score vectors, without running any model.
+
+        The vectors must come from this classifier's score_version, and the
+        rows must be ones that reached NLI under the current settings.
 
-        return category_scores
+        Args:
+            scores: (zero_shot, few_shot) vectors per description
+
+        Returns:
+            List of dictionaries with 'category', 'confidence' and 'tier'
+            keys, like classify_detailed
+        """
+        if not scores:
+            return []
+        zero_shot, few_shot = (np.stack(vectors) for vectors in zip(*scores))
+        tier = "nli" if self.mode == "cascade" else "hybrid"
+        return [{"category": category, "confidence": confidence, "tier": tier}
+                for category, confidence in rerank(zero_shot, few_shot, self.categories,
+                                                   self._weight_in_use())]
 
     def classify(self, transactions: List[str], batch_size: int = 16) -> List[str]:
         """
@@ -144,76 +569,196 @@ class ExpenseClassifier:
         Returns:
             List of assigned categories in the same order as input transactions
         """
-        results = []
+        return [result["category"]
+                for result in self.classify_detailed(transactions, batch_size)]
+
+    def classify_detailed(self, transactions: List[str],
+                          batch_size: int = 16) -> List[Dict[str, Any]]:
+        """
+        Classify transactions and report how each category was decided.
+
+        Descriptions with an unambiguous merchant keyword hit are decided
+        before any model runs (tier "keyword"). With a trained classification
+        head, descriptions it predicts with at least `head_min_confidence`
+        are decided next (tier "head"). In "hybrid" mode everything else goes
+        through zero-shot NLI combined with few-shot scores. In "cascade"
+        mode cheaper tiers run first and NLI only sees what they could not
+        decide:
+
+        - exact: the description's canonical form matches an example
+        - head: the trained head is confident enough
+        - knn: the few-shot vote clears the confidence, margin and similarity thresholds
+        - nli: zero-shot NLI combined with few-shot scores
+
+        Args:
+            transactions: List of transaction descriptions
+            batch_size: Number of transactions to process in one batch
+
+        Returns:
+            List of dictionaries with 'category', 'confidence' and 'tier' keys,
+            in the same order as input transactions
+        """
+        self.profiler.count("classify_batches")
+        self.profiler.count("classified", len(transactions))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(transactions)
         hypotheses = self._prepare_hypotheses()
+        prune = 0 < self.prune_top_k < len(self.categories)
+        cascade = self.mode == "cascade"
 
-        # Process in batches
+        # Process in batches; NLI pairs are bucketed by length in _zero_shot_batch
         for i in range(0, len(transactions), batch_size):
-            batch = transactions[i:i + batch_size]
-
-            # Run zero-shot classification
-            batch_results = self.classifier(
-                batch,
-                hypotheses,
-                multi_label=False
-            )
-            print("batch_results",batch_results)
-            # Combine with few-shot results
-            categories = []
-            for j, result in enumerate(batch_results):
-                transaction = batch[j]
-
-                # Get zero-shot scores
-                zero_shot_scores = {}
-                for idx, label in enumerate(result['labels']):
-                    category_idx = hypotheses.index(label)
-                    category = self.categories[category_idx]
-                    zero_shot_scores[category] = result['scores'][idx]
-
-                # Get few-shot scores
-                few_shot_scores = self._few_shot_classify(transaction)
-
-                # Combine scores (simple weighted average)
-                combined_scores = {}
-                for category in self.categories:
-                    zero_score = zero_shot_scores.get(category, 0.0)
-                    few_score = few_shot_scores.get(category, 0.0)
-
-                    # Give more weight to few-shot if we have examples
-                    weight = 0.7 if few_shot_scores else 0.0
-                    combined_scores[category] = (1 - weight) * zero_score + weight * few_score
-
-                # Get top category
-                if combined_scores:
-                    top_category = max(combined_scores.items(), key=lambda x: x[1])[0]
-                    categories.append(top_category)
-                else:
-                    # Fallback to zero-shot top result
-                    top_idx = result['scores'].index(max(result['scores']))
-                    category_name = self.categories[top_idx]
-                    categories.append(category_name)
-
-            results.extend(categories)
+            rows = list(range(i, min(i + batch_size, len(transactions))))
+
+            rows = self._classify_keywords(transactions, rows, results)
+            if cascade:
+                rows = self._classify_exact(transactions, rows, results)
+            if not rows:
+                continue
+
+            batch = [transactions[row] for row in rows]
+            embeddings = self._encode(batch)
+
+            if self.head is not None:
+                with self.profiler.stage("head"):
+                    probabilities = self.head.predict_proba(embeddings)
+                top = probabilities.argmax(axis=1)
+                confidence = probabilities[np.arange(len(top)), top]
+                decisive = confidence >= self.head_min_confidence
+                for j in np.flatnonzero(decisive):
+                    results[rows[j]] = {"category": self.categories[top[j]],
+                                        "confidence": float(confidence[j]),
+                                        "tier": "head"}
+                undecided = np.flatnonzero(~decisive)
+                if not len(undecided):
+                    continue
+                rows = [rows[j] for j in undecided]
+                batch = [batch[j] for j in undecided]
+                embeddings = embeddings[undecided]
+
+            with self.profiler.stage("knn"):
+                few_shot = self._few_shot_scores(batch, embeddings=embeddings)
+
+            if cascade:
+                decisive = self._decisive_knn(few_shot, embeddings)
+                for j in np.flatnonzero(decisive):
+                    top = int(few_shot[j].argmax())
+                    results[rows[j]] = {"category": self.categories[top],
+                                        "confidence": float(few_shot[j, top]),
+                                        "tier": "knn"}
+                undecided = np.flatnonzero(~decisive)
+                if not len(undecided):
+                    continue
+                rows = [rows[j] for j in undecided]
+                batch = [batch[j] for j in undecided]
+                embeddings = embeddings[undecided]
+                few_shot = few_shot[undecided]
+
+            # Only send the most plausible categories to the NLI model
+            candidates = (self._candidate_categories(embeddings, self.prune_top_k)
+                          if prune else None)
+
+            # Combine zero-shot with few-shot results for the whole batch at once;
+            # pruned categories get a NaN zero-shot score and can't win
+            zero_shot = self._zero_shot_batch(batch, hypotheses, candidates)
+            if candidates is not None:
+                zero_shot = np.where(candidates, zero_shot, np.nan)
+            combined = self._combine_scores(zero_shot, few_shot)
+
+            # Get top category
+            tier = "nli" if cascade else "hybrid"
+            for j, (row, scores) in enumerate(zip(rows, combined)):
+                top = int(scores.argmax())
+                results[row] = {"category": self.categories[top],
+                                "confidence": float(scores[top]),
+                                "tier": tier}
+                if self.keep_scores:
+                    results[row]["scores"] = (zero_shot[j].astype(np.float16),
+                                              few_shot[j].astype(np.float16))
 
         return results
 
+    def _classify_keywords(self, transactions: List[str], rows: List[int],
+                           results: List[Optional[Dict[str, Any]]]) -> List[int]:
+        """
+        Resolve transactions whose merchant keyword hits agree on one category.
+
+        Returns:
+            The rows that are still unclassified
+        """
+        if self.keyword_matcher is None:
+            return rows
+
+        remaining = []
+        for row in rows:
+            category = self.keyword_matcher.match(transactions[row])
+            if category is None:
+                remaining.append(row)
+            else:
+                results[row] = {"category": category, "confidence": 1.0, "tier": "keyword"}
+        return remaining
+
+    def _classify_exact(self, transactions: List[str], rows: List[int],
+                        results: List[Optional[Dict[str, Any]]]) -> List[int]:
+        """
+        Resolve transactions that exactly match an example (after canonicalization).
+
+        Returns:
+            The rows that are still unclassified
+        """
+        remaining = []
+        for row in rows:
+            with self._examples_lock:
+                category_index = self.example_index.lookup(
+                    canonicalize_description(transactions[row]))
+            if category_index is None:
+                remaining.append(row)
+            else:
+                results[row] = {"category": self.categories[category_index],
+                                "confidence": 1.0, "tier": "exact"}
+        return remaining
+
+    def _decisive_knn(self, few_shot: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Decide which few-shot votes are strong enough to skip zero-shot NLI.
+
+        Returns:
+            Boolean array marking rows whose top category clears the cascade
+            confidence, margin and nearest-example similarity thresholds
+        """
+        if few_shot.shape[1] < 2:
+            return np.zeros(len(few_shot), dtype=bool)
+        top_two = -np.partition(-few_shot, 1, axis=1)[:, :2]
+        confidence = top_two[:, 0]
+        margin = top_two[:, 0] - top_two[:, 1]
+        return ((confidence >= self.cascade_min_confidence)
+                & (margin >= self.cascade_min_margin)
+                & (self._nearest_similarity(embeddings) >= self.cascade_min_similarity))
+
     def add_examples(self, new_examples: List[Dict[str, str]]) -> None:
         """
         Add new example transactions to the classifier and update embeddings.
 
+        Only examples the index has not seen are encoded. An example whose
+        (canonical) transaction is already indexed overrides its category.
+        Runtime examples do not change the classifier version, so cached
+        categories stay valid while corrections are fed in.
+
         Args:
             new_examples: List of dictionaries with 'transaction' and 'category' keys
         """
-        added = False
-        for example in new_examples:
-            if 'transaction' in example and 'category' in example:
-                if example['category'] in self.categories:
-                    self.examples.append(example)
-                    added = True
+        with self._examples_lock:
+            self._index_examples(new_examples)
 
-        # Recompute embeddings if we added examples
-        if added:
-            self._prepare_example_embeddings()
+    def remove_examples(self, transactions: List[str]) -> None:
+        """
+        Remove example transactions from the classifier.
+
+        Args:
+            transactions: Transaction texts of the examples to remove
+        """
+        with self._examples_lock:
+            self.example_index.remove(
+                [canonicalize_description(transaction) for transaction in transactions])
 
     def add_rule(self, category: str, rule_description: str) -> None:
         """
@@ -225,40 +770,36 @@ class ExpenseClassifier:
         """
         if category in self.categories:
             self.rules[category.lower()] = rule_description
-
-    def get_confidence_scores(self, transaction: str) -> Dict[str, float]:
+            with self._examples_lock:
+                self._prepare_category_embeddings()
+            self.version = self._compute_version()
+            self.score_version = self._compute_score_version()
+
+    def get_confidence_scores(self, transaction: str,
+                              scores: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                              ) -> Dict[str, float]:
         """
         Get confidence scores for all categories for a single transaction.
 
         Args:
             transaction: Transaction text to classify
+            scores: The transaction's stored (zero_shot, few_shot) vectors
+                from this score_version; when given, no model runs
 
         Returns:
             Dictionary mapping category names to confidence scores
         """
+        if scores is not None:
+            return confidence_scores(*scores, self.categories, self._weight_in_use())
+
         hypotheses = self._prepare_hypotheses()
 
         # Run zero-shot classification
-        result = self.classifier(transaction, hypotheses, multi_label=False)
-
-        # Get zero-shot scores
-        zero_shot_scores = {}
-        for idx, label in enumerate(result['labels']):
-            category_idx = hypotheses.index(label)
-            category = self.categories[category_idx]
-            zero_shot_scores[category] = result['scores'][idx]
-
-        # Get few-shot scores
-        few_shot_scores = self._few_shot_classify(transaction)
-
-        # Combine scores (simple weighted average)
-        combined_scores = {}
-        for category in self.categories:
-            zero_score = zero_shot_scores.get(category, 0.0)
-            few_score = few_shot_scores.get(category, 0.0)
-
-            # Give more weight to few-shot if we have examples
-            weight = 0.7 if few_shot_scores else 0.0
-            combined_scores[category] = (1 - weight) * zero_score + weight * few_score
-
-        return combined_scores
\ No newline at end of file
+        with self._classifier_lock:
+            result = self.classifier(transaction, hypotheses, multi_label=False)
+
+        combined = self._combine_scores(
+            self._zero_shot_scores([result], hypotheses),
+            self._few_shot_scores([transaction]))[0]
+        return {category: float(score)
+                for category, score in zip(self.categories, combined)}
@@ -0,0 +1,127 @@
+import os
+from transformers import AutoTokenizer, pipeline
+from sentence_transformers import SentenceTransformer
+
+BACKENDS = ("torch", "onnx")
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Threads per inference call; 0 keeps the library default (all cores)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", 0))
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "onnx_models")
+# Instruction set the int8 weights are quantized for: avx2, avx512, avx512_vnni or arm64
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")
+
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+
+def _check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Inference backend must be one of {BACKENDS}")
+
+
+def _onnx_dir(model_name: str, kind: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, kind, model_name.replace("/", "__"))
+
+
+def _onnx_session_options():
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if INFERENCE_THREADS:
+        session_options.intra_op_num_threads = INFERENCE_THREADS
+        session_options.inter_op_num_threads = 1
+    return session_options
+
+
+def configure_threads():
+    """Apply INFERENCE_THREADS to PyTorch's intra-op thread pool."""
+    if INFERENCE_THREADS:
+        import torch
+        torch.set_num_threads(INFERENCE_THREADS)
+
+
+def load_zero_shot_pipeline(model_name: str, backend: str = INFERENCE_BACKEND):
+    """
+    Load a zero-shot classification pipeline on CPU.
+
+    With the "onnx" backend the model is exported to ONNX and dynamically
+    quantized to int8 on first use. The artifact is cached under
+    ONNX_CACHE_DIR, so later starts load it directly.
+
+    Args:
+        model_name: Hugging Face model name
+        backend: "torch" for eager PyTorch, "onnx" for quantized ONNX Runtime
+
+    Returns:
+        A transformers zero-shot classification pipeline
+    """
+    _check_backend(backend)
+    if backend == "torch":
+        configure_threads()
+        return pipeline("zero-shot-classification",
+                        model=model_name,
+                        device=-1)
+
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise ImportError("The onnx backend requires optimum[onnxruntime]") from e
+
+    model_dir = _onnx_dir(model_name, "zero-shot")
+    if not os.path.exists(os.path.join(model_dir, QUANTIZED_FILE_NAME)):
+        print(f"Exporting {model_name} to quantized ONNX in {model_dir}")
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+
+        quantization_config = getattr(AutoQuantizationConfig, ONNX_QUANTIZATION)(
+            is_static=False, per_channel=False)
+        ORTQuantizer.from_pretrained(model).quantize(
+            save_dir=model_dir, quantization_config=quantization_config)
+
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_dir,
+        file_name=QUANTIZED_FILE_NAME,
+        session_options=_onnx_session_options())
+    return pipeline("zero-shot-classification",
+                    model=model,
+                    tokenizer=AutoTokenizer.from_pretrained(model_dir),
+                    device=-1)
+
+
+def load_sentence_model(model_name: str, backend: str = INFERENCE_BACKEND) -> SentenceTransformer:
+    """
+    Load a sentence transformer on CPU.
+
+    With the "onnx" backend the model is exported and dynamically quantized
+    to int8 once, then loaded from ONNX_CACHE_DIR on later starts.
+
+    Args:
+        model_name: Hugging Face model name
+        backend: "torch" for eager PyTorch, "onnx" for quantized ONNX Runtime
+
+    Returns:
+        A SentenceTransformer
+    """
+    _check_backend(backend)
+    if backend == "torch":
+        configure_threads()
+        return SentenceTransformer(model_name, device="cpu")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    model_dir = _onnx_dir(model_name, "embedding")
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        print(f"Exporting {model_name} to quantized ONNX in {model_dir}")
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+        model.save_pretrained(model_dir)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, model_dir)
+
+    return SentenceTransformer(
+        model_dir,
+        device="cpu",
+        backend="onnx",
+        model_kwargs={"file_name": file_name,
+                      "session_options": _onnx_session_options()})
@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+
+class InferenceScheduler:
+    """
+    Dynamic micro-batching in front of the classifier.
+
+    Every active job submits its descriptions to one shared queue. A single
+    scheduler thread collects pending descriptions, from any number of jobs,
+    until it has `max_batch_size` of them or the oldest has waited
+    `max_wait_ms`. It then runs the whole batch in one classifier call and
+    hands each result back to the caller that asked for it. A description
+    that several jobs ask for at the same time is classified once.
+    """
+
+    def __init__(self, engine, max_batch_size: int = 64, max_wait_ms: float = 20):
+        """
+        Args:
+            engine: Object with a classify_detailed(descriptions, batch_size) method,
+                such as ExpenseClassifier or ClassifierPool
+            max_batch_size: Most descriptions run in one classifier call
+            max_wait_ms: Longest a description waits for the batch to fill
+        """
+        self.engine = engine
+        self.batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, descriptions: List[str]) -> List[Future]:
+        """Queue descriptions for classification and return one future per description."""
+        futures = []
+        for description in descriptions:
+            future = Future()
+            self._queue.put((description, future))
+            futures.append(future)
+        return futures
+
+    def classify_detailed(self, descriptions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Classify descriptions through the shared batches, blocking until done.
+
+        Returns:
+            The same results as ExpenseClassifier.classify_detailed, in input order
+        """
+        return [future.result() for future in self.submit(descriptions)]
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Identical descriptions from different jobs share one slot
+            waiting: Dict[str, List[Future]] = {}
+            for description, future in batch:
+                if future.set_running_or_notify_cancel():
+                    waiting.setdefault(description, []).append(future)
+            if not waiting:
+                continue
+
+            descriptions = list(waiting)
+            try:
+                results = self.engine.classify_detailed(descriptions, batch_size=len(descriptions))
+            except Exception as e:
+                for futures in waiting.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            for description, result in zip(descriptions, results):
+                for future in waiting[description]:
+                    future.set_result(result)
@@ -0,0 +1,203 @@
+import datetime
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Callable, Dict, Optional
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be admitted because the queue is at capacity."""
+
+
+class JobQueue:
+    """
+    Durable, bounded queue of classification jobs backed by SQLite.
+
+    Jobs survive a container restart: anything still RUNNING when the
+    process stops is queued again on the next start. A fixed pool of worker
+    threads takes jobs in fair order. Users with fewer running jobs go first,
+    then small files (at most `small_job_rows` rows) ahead of large ones,
+    then the oldest job.
+    """
+
+    def __init__(self, db_path: str, handler: Callable[[Dict[str, Any], Callable], None],
+                 workers: int = 2, max_queued: int = 100, max_queued_per_user: int = 10,
+                 small_job_rows: int = 1000):
+        """
+        Args:
+            db_path: Path of the SQLite database file
+            handler: Called with (job, progress_callback) to run a job;
+                progress_callback(processed, total) records progress
+            workers: Number of jobs processed concurrently
+            max_queued: Queued jobs admitted before submissions are rejected
+            max_queued_per_user: Queued jobs a single user may have
+            small_job_rows: Jobs with at most this many rows jump ahead of larger ones
+        """
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.small_job_rows = small_job_rows
+        self._condition = threading.Condition()
+        self._threads = []
+        self._init_db()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _init_db(self):
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    row_count INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, user_id)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_file ON jobs (file_id)")
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().replace(microsecond=0).isoformat(sep=" ")
+
+    def start(self):
+        """Requeue jobs interrupted by a restart and start the worker threads."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (QUEUED, RUNNING))
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"classify-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, user_id: str, file_id: int, row_count: int = 0) -> Dict[str, Any]:
+        """
+        Queue a job, or return the existing one if the file is already queued or running.
+
+        Args:
+            user_id: Owner of the file
+            file_id: Upload to classify
+            row_count: Estimated number of rows, used for scheduling
+
+        Returns:
+            The job as a dictionary
+
+        Raises:
+            QueueFullError: If the queue or the user's share of it is full
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = connection.execute(
+                "SELECT * FROM jobs WHERE file_id = ? AND user_id = ? AND status IN (?, ?)",
+                (file_id, user_id, QUEUED, RUNNING)).fetchone()
+            if existing:
+                connection.execute("COMMIT")
+                return dict(existing)
+
+            queued, user_queued = connection.execute(
+                "SELECT COUNT(*), SUM(user_id = ?) FROM jobs WHERE status = ?",
+                (user_id, QUEUED)).fetchone()
+            if queued >= self.max_queued or (user_queued or 0) >= self.max_queued_per_user:
+                connection.execute("ROLLBACK")
+                raise QueueFullError("Classification queue is full")
+
+            cursor = connection.execute(
+                "INSERT INTO jobs (user_id, file_id, status, row_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, file_id, QUEUED, row_count, self._now()))
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+        with self._condition:
+            self._condition.notify()
+        return dict(job)
+
+    def status(self, file_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Return the latest job for a file.
+
+        Args:
+            file_id: Upload to look up
+
+        Returns:
+            The job as a dictionary, or None if the file was never queued
+        """
+        with closing(self._connect()) as connection:
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE file_id = ? ORDER BY id DESC LIMIT 1",
+                (file_id,)).fetchone()
+            return dict(job) if job else None
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            job = connection.execute("""
+                SELECT j.* FROM jobs j
+                WHERE j.status = ?
+                ORDER BY (SELECT COUNT(*) FROM jobs r
+                          WHERE r.user_id = j.user_id AND r.status = ?),
+                         j.row_count > ?,
+                         j.id
+                LIMIT 1
+            """, (QUEUED, RUNNING, self.small_job_rows)).fetchone()
+            if job is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (RUNNING, self._now(), job["id"]))
+            connection.execute("COMMIT")
+            return dict(job)
+        finally:
+            connection.close()
+
+    def _update(self, job_id: int, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _work(self):
+        while True:
+            job = self._claim_next()
+            if job is None:
+                with self._condition:
+                    self._condition.wait(timeout=5)
+                continue
+
+            def progress(processed, total, job_id=job["id"]):
+                self._update(job_id, processed=processed, total=total)
+
+            try:
+                self.handler(job, progress)
+                self._update(job["id"], status=COMPLETED, finished_at=self._now())
+            except Exception as e:
+                print(f"Classification job {job['id']} failed: {e}")
+                self._update(job["id"], status=FAILED, message=str(e)[:200],
+                             finished_at=self._now())
@@ -0,0 +1,139 @@
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+import yaml
+from normalization import normalize_description
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over merchant keywords.
+
+    All keywords are matched in a single pass over the description, so the
+    cost of a lookup depends on the description length and not on how many
+    keywords are registered. A keyword only matches whole words, so "IRS"
+    matches neither "FIRST" nor "IRSHAD". A keyword ending in "*" is a
+    prefix and may run into the following characters, so "IRAS*" matches
+    "IRASITXSjhdddA".
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        """
+        Build the automaton.
+
+        Args:
+            keywords: Dictionary mapping keyword text to category
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per node: (keyword length, category, is prefix) for every keyword ending there
+        self._output: List[List[Tuple[int, str, bool]]] = [[]]
+
+        for keyword, category in keywords.items():
+            keyword = normalize_description(keyword)
+            prefix = keyword.endswith("*")
+            self._add(keyword.rstrip("*").rstrip(), category, prefix)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, category: str, prefix: bool):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append((len(keyword), category, prefix))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, description: str) -> List[Tuple[int, int, str]]:
+        """
+        Find every keyword occurrence that starts at a word boundary and,
+        unless the keyword is a prefix, also ends at one.
+
+        Args:
+            description: Raw transaction description
+
+        Returns:
+            List of (start, end, category) spans over the normalized description
+        """
+        text = normalize_description(description)
+        matches = []
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, category, prefix in self._output[node]:
+                start = end - length
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                # Keywords ending in punctuation, like "Disney+", need no boundary after them
+                if (prefix or end == len(text) or not text[end].isalnum()
+                        or not text[end - 1].isalnum()):
+                    matches.append((start, end, category))
+        return matches
+
+    def match(self, description: str) -> Optional[str]:
+        """
+        Return a category only when the description's keyword hits are unambiguous.
+
+        Hits that sit inside a longer hit are ignored, so a specific keyword
+        such as "uber eats" wins over "uber".
+
+        Args:
+            description: Raw transaction description
+
+        Returns:
+            The category all remaining hits agree on, or None
+        """
+        matches = self.find(description)
+        categories = {category for start, end, category in matches
+                      if not any(other_start <= start and end <= other_end
+                                 and (other_end - other_start) > (end - start)
+                                 for other_start, other_end, _ in matches)}
+        if len(categories) == 1:
+            return categories.pop()
+        return None
+
+
+def load_merchant_keywords(merchants: Dict[str, Iterable[str]],
+                           merchant_list_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Collect keyword -> category pairs from config and an optional merchant list file.
+
+    Both sources use the same shape: a mapping of category to a list of
+    keywords. Entries in the merchant list file override the config.
+
+    Args:
+        merchants: The `merchants` section of the classifier config
+        merchant_list_path: Optional YAML file with user-maintained merchants
+
+    Returns:
+        Dictionary mapping keyword text to category
+    """
+    sources = [merchants or {}]
+    if merchant_list_path and os.path.exists(merchant_list_path):
+        with open(merchant_list_path, 'r') as file:
+            sources.append(yaml.safe_load(file) or {})
+
+    keywords = {}
+    for source in sources:
+        for category, category_keywords in source.items():
+            for keyword in category_keywords or []:
+                keywords[keyword] = category
+    return keywords
@@ -1,14 +1,19 @@
 from flask import Flask, jsonify, request
 from db import init_db, close_db
+import json
 import os
-import threading
-from transformers import pipeline
-from batch_classifier import BatchClassifier
+from batch_classifier import BatchClassifier, classify_descriptions, count_pending_rows
+from model_registry import registry
+from description_cache import description_cache
+from example_store import example_store
+from job_queue import JobQueue, QueueFullError
+from worker_pool import ClassifierPool, prepare_fork
+from inference_scheduler import InferenceScheduler
+from profiler import metrics
+from reclassifier import Reclassifier
 
 
 app = Flask(__name__)
-classifier = pipeline("zero-shot-classification",
-                      model="facebook/bart-large-mnli")
 
 app.config["MYSQL_HOST"] = os.getenv("MYSQL_HOST", "host.docker.internal")
 app.config["MYSQL_PORT"] = int(os.getenv("MYSQL_PORT", 3306))
@@ -18,6 +23,39 @@ app.config["MYSQL_DB"] = os.getenv("MYSQL_DB", "expense_insights")
 
 init_db(app)
 
+classify_processes = int(os.getenv("CLASSIFY_PROCESSES", 0))
+if classify_processes > 0:
+    # The inference libraries must not start thread pools before the fork
+    prepare_fork()
+
+# Load the models once at startup; every classification job shares them.
+# Examples added at runtime are restored before the fork, so worker
+# processes see them too
+with app.app_context():
+    registry.get_classifier().add_examples(example_store.load())
+
+# Fork the classification processes now, after the models load and before
+# any worker threads start, so they share the weights copy-on-write
+worker_pool = (ClassifierPool(registry.get_classifier(), classify_processes)
+               if classify_processes > 0 else None)
+
+# One scheduler batches descriptions from every running job into shared forward passes;
+# with a pool, each batch is large enough to give every worker a full shard
+inference_max_batch = int(os.getenv("INFERENCE_MAX_BATCH", 64))
+inference_scheduler = InferenceScheduler(
+    worker_pool or registry.get_classifier(),
+    max_batch_size=(max(inference_max_batch, worker_pool.batch_size)
+                    if worker_pool is not None else inference_max_batch),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", 20))
+)
+
+# Request limits for the synchronous POST /classify/batch endpoint
+CLASSIFY_BATCH_MAX_ITEMS = int(os.getenv("CLASSIFY_BATCH_MAX_ITEMS", 1000))
+CLASSIFY_BATCH_MAX_LENGTH = int(os.getenv("CLASSIFY_BATCH_MAX_LENGTH", 500))
+
+# When set, every classification job writes its profile as JSON into this directory
+CLASSIFY_PROFILE_DIR = os.getenv("CLASSIFY_PROFILE_DIR")
+
 
 @app.route('/classify', methods=['POST'])
 def classify_text():
@@ -26,26 +64,190 @@ def classify_text():
         user_id = data['user_id']
         file_id = data['file_id']
 
-        thread = threading.Thread(
-            target=process_classification, args=(user_id, file_id))
-        thread.start()
+        job = job_queue.submit(user_id, file_id, count_pending_rows(user_id, file_id))
+
+        return jsonify({'status': 'success', 'message': 'Processing queued',
+                        'job': job}), 200
+
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '30'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/classify/batch', methods=['POST'])
+def classify_batch():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'descriptions' not in data:
+            return jsonify({'error': 'Request body must be a JSON object with descriptions'}), 400
+        descriptions = data['descriptions']
+        user_id = data.get('user_id') or ''
+        use_cache = data.get('use_cache', True)
+
+        if not isinstance(descriptions, list) or not all(
+                isinstance(desc, str) for desc in descriptions):
+            return jsonify({'error': 'descriptions must be a list of strings'}), 400
+        if not isinstance(use_cache, bool):
+            return jsonify({'error': 'use_cache must be true or false'}), 400
+        if len(descriptions) > CLASSIFY_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'At most {CLASSIFY_BATCH_MAX_ITEMS} descriptions '
+                                     f'per request'}), 413
+        if any(len(desc) > CLASSIFY_BATCH_MAX_LENGTH for desc in descriptions):
+            return jsonify({'error': f'Descriptions are limited to '
+                                     f'{CLASSIFY_BATCH_MAX_LENGTH} characters'}), 413
+
+        results = classify_descriptions(descriptions, inference_scheduler, user_id, use_cache)
+        return jsonify({'status': 'success', 'version': registry.get_classifier().version,
+                        'results': results}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/classify/<int:file_id>/status', methods=['GET'])
+def classify_status(file_id):
+    job = job_queue.status(file_id)
+    if job is None:
+        return jsonify({'error': 'No classification job for this file'}), 404
+    return jsonify({'status': 'success', 'job': job}), 200
+
+
+@app.route('/reclassify', methods=['POST'])
+def reclassify():
+    # Legacy rows without a version may hold manual corrections, so they
+    # are only classified again on request
+    data = request.get_json(silent=True) or {}
+    reclassifier.trigger(backfill=bool(data.get('backfill', False)))
+    return jsonify({'status': 'success', 'message': 'Reclassification started',
+                    'version': registry.get_classifier().version}), 202
+
+
+@app.route('/reclassify/status', methods=['GET'])
+def reclassify_status():
+    try:
+        return jsonify({'status': 'success', 'version': registry.get_classifier().version,
+                        'checkpoints': reclassifier.status()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({'status': 'success', 'metrics': metrics.snapshot()}), 200
 
-        return jsonify({'status': 'success', 'message': 'Processing started'}), 200
+
+@app.route('/cache/override', methods=['POST'])
+def override_category():
+    try:
+        data = request.get_json()
+        user_id = data['user_id']
+        description = data['description']
+        category = data['category']
+
+        if category not in registry.get_classifier().categories:
+            return jsonify({'error': f'Unknown category: {category}'}), 400
+
+        description_cache.set_override(user_id, description, category)
+        return jsonify({'status': 'success', 'message': 'Override saved'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def examples_pool_error():
+    # Forked workers hold their own copy of the examples and can't be updated
+    return jsonify({'error': 'Examples cannot change at runtime while CLASSIFY_PROCESSES '
+                             'worker processes are running'}), 409
+
+
+@app.route('/examples', methods=['POST'])
+def add_examples():
+    try:
+        if worker_pool is not None:
+            return examples_pool_error()
+        data = request.get_json(silent=True)
+        examples = data.get('examples') if isinstance(data, dict) else None
+        categories = registry.get_classifier().categories
+        if not isinstance(examples, list) or not all(
+                isinstance(example, dict) and isinstance(example.get('transaction'), str)
+                and example.get('category') in categories for example in examples):
+            return jsonify({'error': 'examples must be a list of {transaction, category} '
+                                     'with known categories'}), 400
+
+        example_store.save(examples)
+        registry.get_classifier().add_examples(examples)
+        return jsonify({'status': 'success', 'message': 'Examples added'}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def process_classification(user_id, file_id):
+@app.route('/examples', methods=['DELETE'])
+def remove_examples():
+    try:
+        if worker_pool is not None:
+            return examples_pool_error()
+        data = request.get_json()
+        transactions = data['transactions']
+        example_store.remove(transactions)
+        registry.get_classifier().remove_examples(transactions)
+        return jsonify({'status': 'success', 'message': 'Examples removed'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def process_classification(job, progress_callback):
+    user_id, file_id = job['user_id'], job['file_id']
     with app.app_context():
         try:
             expense_classifier = BatchClassifier(
-                user_id, file_id)
+                user_id, file_id, progress_callback, inference_scheduler,
+                write_chunk_size=int(os.getenv("CLASSIFY_WRITE_CHUNK_SIZE", 500)),
+                fetch_page_size=int(os.getenv("CLASSIFY_FETCH_PAGE_SIZE", 1000)))
             expense_classifier.process_table_data()
             print(
-                f"Classification completed for user {user_id}, upload {file_id}")
+                f"Classification completed for user {user_id}, upload {file_id}: "
+                f"{dict(expense_classifier.tier_counts)}")
+            if CLASSIFY_PROFILE_DIR:
+                write_profile(job, expense_classifier.profile())
         except Exception as e:
             print(f" Error during classification: {e}")
+            raise
+
+
+def write_profile(job, profile):
+    try:
+        os.makedirs(CLASSIFY_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(CLASSIFY_PROFILE_DIR, f"job-{job['id']}-file-{job['file_id']}.json")
+        with open(path, 'w') as file:
+            json.dump(profile, file, indent=2)
+    except Exception as e:
+        print(f"Error writing job profile: {e}")
+
+
+job_queue = JobQueue(
+    os.getenv("JOB_DB_PATH", "jobs.db"),
+    process_classification,
+    workers=int(os.getenv("CLASSIFY_WORKERS", 2)),
+    max_queued=int(os.getenv("CLASSIFY_MAX_QUEUED", 100)),
+    max_queued_per_user=int(os.getenv("CLASSIFY_MAX_QUEUED_PER_USER", 10)),
+    small_job_rows=int(os.getenv("CLASSIFY_SMALL_JOB_ROWS", 1000))
+)
+job_queue.start()
+
+# Bring rows classified under an older config up to date in the background
+reclassifier = Reclassifier(
+    app,
+    registry.get_classifier(),
+    inference_scheduler,
+    chunk_size=int(os.getenv("RECLASSIFY_CHUNK_SIZE", 500)),
+    pause_seconds=float(os.getenv("RECLASSIFY_PAUSE_SECONDS", 1.0))
+)
+reclassifier.start()
+if os.getenv("RECLASSIFY_ON_START", "0") == "1":
+    reclassifier.trigger()
 
 
 if __name__ == '__main__':
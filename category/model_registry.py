@@ -0,0 +1,75 @@
+import os
+import threading
+from typing import Dict, Tuple
+from sentence_transformers import SentenceTransformer
+from expense_classifier import ExpenseClassifier
+from inference_backend import INFERENCE_BACKEND, load_sentence_model, load_zero_shot_pipeline
+
+CONFIG_PATH = os.getenv("CLASSIFIER_CONFIG", "config.yaml")
+CLASSIFICATION_MODEL = os.getenv(
+    "CLASSIFICATION_MODEL", "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli")
+EMBEDDING_MODEL = os.getenv(
+    "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models and classifiers.
+
+    Every model is loaded at most once and shared by all classification jobs.
+    Each model gets its own inference lock so concurrent jobs never run a
+    forward pass on the same model at the same time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._models: Dict[Tuple[str, str, str], object] = {}
+        self._inference_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._classifiers: Dict[Tuple[str, str, str, str], ExpenseClassifier] = {}
+
+    def _get_or_load(self, kind: str, model_name: str, backend: str, loader):
+        key = (kind, model_name, backend)
+        with self._lock:
+            if key not in self._models:
+                print(f"Loading {kind} model: {model_name} ({backend})")
+                self._models[key] = loader(model_name, backend)
+                self._inference_locks.setdefault((model_name, backend), threading.Lock())
+            return self._models[key]
+
+    def get_zero_shot_pipeline(self, model_name: str, backend: str = INFERENCE_BACKEND):
+        """Return the shared zero-shot classification pipeline for a model."""
+        return self._get_or_load("zero-shot", model_name, backend, load_zero_shot_pipeline)
+
+    def get_sentence_model(self, model_name: str,
+                           backend: str = INFERENCE_BACKEND) -> SentenceTransformer:
+        """Return the shared sentence transformer for a model."""
+        return self._get_or_load("embedding", model_name, backend, load_sentence_model)
+
+    def inference_lock(self, model_name: str, backend: str = INFERENCE_BACKEND) -> threading.Lock:
+        """Return the lock that serializes inference on a loaded model."""
+        with self._lock:
+            return self._inference_locks.setdefault((model_name, backend), threading.Lock())
+
+    def get_classifier(self, config_path: str = CONFIG_PATH,
+                       classification_model: str = CLASSIFICATION_MODEL,
+                       embedding_model: str = EMBEDDING_MODEL,
+                       backend: str = INFERENCE_BACKEND) -> ExpenseClassifier:
+        """
+        Return the shared ExpenseClassifier for a config, model pair and backend,
+        building it (and encoding its examples) only on first use.
+        """
+        key = (config_path, classification_model, embedding_model, backend)
+        with self._build_lock:
+            if key not in self._classifiers:
+                self._classifiers[key] = ExpenseClassifier(
+                    config_path,
+                    classification_model=classification_model,
+                    embedding_model=embedding_model,
+                    registry=self,
+                    backend=backend
+                )
+            return self._classifiers[key]
+
+
+registry = ModelRegistry()
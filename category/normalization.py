@@ -0,0 +1,57 @@
+import re
+
+# Card number suffixes such as "*1234", "XX1234", "x-1234" or "card ending 1234"
+_CARD_SUFFIX = re.compile(r"(\*+|\bx{2,}-?|\bcard ending\s*)\d{2,}")
+# Dates such as "04/12", "04-12-2024", "2024.04.12"
+_DATE = re.compile(r"\b\d{1,4}[/\-.]\d{1,2}([/\-.]\d{1,4})?\b")
+# Reference markers whose value is the next token, such as "ref 12345" or "txn# A1B2"
+_REFERENCE = re.compile(r"\b(ref|txn|trx|inv|no|id)\b[#:.]*\s*\S*\d\S*")
+# Hyphens inside a word, as in "7-eleven" or "e-mart"; joined so brands stay one token
+_INNER_HYPHEN = re.compile(r"(?<=[a-z0-9])-(?=[a-z0-9])")
+_PUNCTUATION = re.compile(r"[^a-z0-9\s]+")
+# Country codes card networks append to the merchant name
+_TRAILING_COUNTRY = {"sg", "sgp", "my", "us", "usa", "gb", "au", "hk"}
+_NOISE_TOKENS = {"www", "com"}
+
+
+def normalize_description(description: str) -> str:
+    """Lowercase a description and collapse its whitespace."""
+    return " ".join(str(description).lower().split())
+
+
+def _mostly_digits(token: str) -> bool:
+    """Reference numbers, terminal ids and amounts have more digits than letters."""
+    digits = sum(character.isdigit() for character in token)
+    return digits > len(token) - digits
+
+
+def canonicalize_description(description: str) -> str:
+    """
+    Reduce a bank description to a key shared by its near-duplicates.
+
+    Reference numbers, dates, card suffixes, mostly-digit tokens and
+    punctuation are stripped and case and whitespace normalized, so
+    "GRAB*RIDE 8823 SG" and "Grab Ride 1190" both become "grab ride".
+    Tokens with at least as many letters as digits are brand names, not
+    numbers, and are kept: "M1 Bill" becomes "m1 bill" and "7-ELEVEN 1234"
+    becomes "7eleven".
+
+    Args:
+        description: Raw transaction description
+
+    Returns:
+        The canonical key, or the normalized description when nothing
+        would be left after stripping
+    """
+    normalized = normalize_description(description)
+    text = _CARD_SUFFIX.sub(" ", normalized)
+    text = _DATE.sub(" ", text)
+    text = _REFERENCE.sub(" ", text)
+    text = _INNER_HYPHEN.sub("", text.replace("'", ""))
+    text = _PUNCTUATION.sub(" ", text)
+
+    tokens = [token for token in text.split()
+              if token not in _NOISE_TOKENS and not _mostly_digits(token)]
+    if len(tokens) > 1 and tokens[-1] in _TRAILING_COUNTRY:
+        tokens.pop()
+    return " ".join(tokens) or normalized
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class Profiler:
+    """
+    Thread-safe accumulator of per-stage timings and counters.
+
+    Stages are timed with `with profiler.stage("name"):` and counters are
+    bumped with `profiler.count("name", n)`. A profiler created with a parent
+    also records everything into the parent. A job's own profile therefore
+    feeds the process-wide metrics as well.
+    """
+
+    def __init__(self, parent: Optional["Profiler"] = None):
+        self.parent = parent
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # Stage name -> [calls, total seconds, slowest call in seconds]
+        self._stages: Dict[str, list] = {}
+        self._counters = Counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one call of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """Add one timed call of a stage."""
+        with self._lock:
+            stage = self._stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+        if self.parent is not None:
+            self.parent.record(name, seconds)
+
+    def count(self, name: str, value: int = 1):
+        """Increase a counter."""
+        with self._lock:
+            self._counters[name] += value
+        if self.parent is not None:
+            self.parent.count(name, value)
+
+    def drain(self) -> Dict[str, Any]:
+        """
+        Take everything recorded so far and start over.
+
+        Returns:
+            Raw 'stages' and 'counters' in the form merge() accepts
+        """
+        with self._lock:
+            raw = {"stages": self._stages, "counters": dict(self._counters)}
+            self._stages, self._counters = {}, Counter()
+        return raw
+
+    def merge(self, raw: Dict[str, Any]):
+        """Add stages and counters drained from another profiler, such as a worker process's."""
+        with self._lock:
+            for name, (calls, total, slowest) in raw["stages"].items():
+                stage = self._stages.setdefault(name, [0, 0.0, 0.0])
+                stage[0] += calls
+                stage[1] += total
+                stage[2] = max(stage[2], slowest)
+            self._counters.update(raw["counters"])
+        if self.parent is not None:
+            self.parent.merge(raw)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarize everything recorded so far.
+
+        Returns:
+            Dictionary with 'stages' (calls, total seconds, mean and max
+            milliseconds per stage), raw 'counters' and the derived
+            'cache_hit_rate', 'descriptions_per_second', 'padding_ratio'
+            and mean batch sizes
+        """
+        with self._lock:
+            stages = {name: list(values) for name, values in self._stages.items()}
+            counters = dict(self._counters)
+
+        def ratio(numerator, denominator):
+            return counters.get(numerator, 0) / denominator if denominator else 0.0
+
+        job_seconds = stages.get("job", [0, 0.0, 0.0])[1]
+        padded_tokens = counters.get("nli_padded_tokens", 0)
+        return {
+            "started_at": self.started,
+            "stages": {
+                name: {"calls": calls,
+                       "seconds": round(total, 4),
+                       "mean_ms": round(1000 * total / calls, 2) if calls else 0.0,
+                       "max_ms": round(1000 * slowest, 2)}
+                for name, (calls, total, slowest) in sorted(stages.items())
+            },
+            "counters": counters,
+            "cache_hit_rate": ratio("cache_hits", counters.get("cache_lookups", 0)),
+            "descriptions_per_second": ratio("descriptions", job_seconds),
+            "padding_ratio": (1 - counters.get("nli_tokens", 0) / padded_tokens
+                              if padded_tokens else 0.0),
+            "mean_classify_batch": ratio("classified", counters.get("classify_batches", 0)),
+            "mean_nli_batch_pairs": ratio("nli_pairs", counters.get("nli_batches", 0)),
+        }
+
+
+# Process-wide metrics served by GET /metrics
+metrics = Profiler()
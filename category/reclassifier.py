@@ -0,0 +1,346 @@
+import datetime
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from db import get_db
+from description_cache import description_cache
+from expense_classifier import WEIGHTS_FINGERPRINT
+from normalization import canonicalize_description
+from score_store import score_store
+
+RUNNING = "RUNNING"
+DONE = "DONE"
+
+# Where a stored category came from; only model output is ever reclassified
+SOURCE_MODEL = "model"
+SOURCE_USER = "user"
+
+
+class Reclassifier:
+    """
+    Background reclassification of rows stamped with an outdated classifier version.
+
+    Every category the classifier writes carries the version that produced
+    it and `category_source = 'model'`. Categories a user set by hand have
+    `category_source = 'user'` and are never touched. Rows from before
+    versioning (no version, no source) are legacy: they may hold manual
+    corrections, so they are only classified again when a backfill is
+    requested explicitly.
+
+    The per-category fingerprints of each version are recorded in
+    classifier_versions. When the configuration changes, the fingerprints
+    of a stale version are compared with the current ones:
+
+    - If shared settings, models or the category list changed, or the stale
+      version is unknown, every row of that version is classified again.
+    - If only the few-shot weight changed, every row is decided again, but
+      descriptions with stored score vectors (keep_scores) are re-ranked
+      from them instead of running the models.
+    - Otherwise only rows assigned to a category whose rule, examples or
+      merchant keywords changed are classified again. All other rows are
+      re-stamped with the current version without running any model. A row
+      that a changed rule would now pull into its category is not revisited.
+
+    Work runs in chunks of `chunk_size` rows, one transaction each, with a
+    pause in between so classification jobs keep priority. After every
+    chunk the last row id is checkpointed in reclassify_checkpoints, so a
+    restart resumes where the previous run stopped.
+    """
+
+    def __init__(self, app, classifier, engine, chunk_size: int = 500,
+                 pause_seconds: float = 1.0):
+        """
+        Args:
+            app: Flask app, for database access from the background thread
+            classifier: The shared ExpenseClassifier, for its version and fingerprints
+            engine: Object with a classify_detailed(descriptions) method
+            chunk_size: Rows read, classified and written per transaction
+            pause_seconds: Pause between chunks
+        """
+        self.app = app
+        self.classifier = classifier
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+        self._wake = threading.Event()
+        self._thread = None
+        self._backfill = False
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().replace(microsecond=0)
+
+    def start(self):
+        """Start the background thread; it waits for trigger() to run a pass."""
+        self._thread = threading.Thread(target=self._run, name="reclassifier", daemon=True)
+        self._thread.start()
+
+    def trigger(self, backfill: bool = False):
+        """
+        Ask the background thread for another pass over stale rows.
+
+        Args:
+            backfill: Also classify legacy rows that carry no version
+        """
+        self._backfill = self._backfill or backfill
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            backfill, self._backfill = self._backfill, False
+            try:
+                self.run_pass(backfill)
+            except Exception as e:
+                print(f"Reclassification failed: {e}")
+
+    def run_pass(self, backfill: bool = False):
+        """Bring every model-written row up to the current classifier version."""
+        with self.app.app_context():
+            self.register_version()
+            stale_versions = self._stale_versions(backfill)
+        for source_version in stale_versions:
+            self._reclassify_version(source_version)
+
+    @staticmethod
+    def _source_filter(source_version: Optional[str]) -> str:
+        """SQL condition on category_source for the rows of a stale version."""
+        if source_version is None:
+            return "category_source IS NULL"
+        return f"category_source = '{SOURCE_MODEL}'"
+
+    def register_version(self):
+        """Record the current version's fingerprints for later comparisons."""
+        db, cursor = get_db()
+        cursor.execute(
+            "INSERT IGNORE INTO expense_insights.classifier_versions "
+            "(version, fingerprints, created_at) VALUES (%s, %s, %s)",
+            (self.classifier.version,
+             json.dumps(self.classifier.category_fingerprints(), sort_keys=True),
+             self._now()))
+        db.commit()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Return the checkpoints towards the current classifier version."""
+        db, cursor = get_db()
+        cursor.execute("""
+            SELECT source_version, last_id, processed, restamped, status, updated_at
+            FROM expense_insights.reclassify_checkpoints
+            WHERE target_version = %s
+        """, (self.classifier.version,))
+        return [
+            {"source_version": source_version or None, "last_id": last_id,
+             "processed": processed, "restamped": restamped, "status": status,
+             "updated_at": str(updated_at) if updated_at else None}
+            for source_version, last_id, processed, restamped, status, updated_at
+            in cursor.fetchall()
+        ]
+
+    def _stale_versions(self, backfill: bool = False) -> List[Optional[str]]:
+        """
+        Versions with model-written rows to bring up to date.
+
+        Returns:
+            Stale version names, plus None for legacy rows when backfilling
+        """
+        db, cursor = get_db()
+        cursor.execute(f"""
+            SELECT DISTINCT category_version
+            FROM expense_insights.expenses
+            WHERE category_source = '{SOURCE_MODEL}' AND category_version <> %s
+            AND category IS NOT NULL AND category <> ''
+        """, (self.classifier.version,))
+        versions = [row[0] for row in cursor.fetchall()]
+        if backfill:
+            cursor.execute("""
+                SELECT 1 FROM expense_insights.expenses
+                WHERE category_version IS NULL AND category_source IS NULL
+                AND category IS NOT NULL AND category <> ''
+                LIMIT 1
+            """)
+            if cursor.fetchone():
+                versions.append(None)
+        return versions
+
+    def _old_fingerprints(self, source_version: Optional[str]) -> Optional[Dict[str, str]]:
+        if source_version is None:
+            return None
+        db, cursor = get_db()
+        cursor.execute(
+            "SELECT fingerprints FROM expense_insights.classifier_versions WHERE version = %s",
+            (source_version,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _changed_categories(self, old: Optional[Dict[str, str]]) -> Optional[List[str]]:
+        """
+        Categories whose configuration differs between a stale version and the current one.
+
+        Args:
+            old: The stale version's fingerprints, None if unknown
+
+        Returns:
+            The changed category names, or None if every category must be
+            classified again
+        """
+        new = self.classifier.category_fingerprints()
+        if old is None or old.get("") != new[""]:
+            return None
+        # The weights apply to every NLI-decided row, whatever its category
+        if old.get(WEIGHTS_FINGERPRINT) != new[WEIGHTS_FINGERPRINT]:
+            return None
+        return [category for category in self.classifier.categories
+                if old.get(category) != new[category]]
+
+    def _rerankable(self, old: Optional[Dict[str, str]]) -> bool:
+        """Whether only the weights changed, so stored score vectors still apply."""
+        new = self.classifier.category_fingerprints()
+        return old is not None and all(
+            old.get(key) == fingerprint for key, fingerprint in new.items()
+            if key != WEIGHTS_FINGERPRINT)
+
+    def _load_checkpoint(self, source_version: Optional[str]) -> Dict[str, Any]:
+        db, cursor = get_db()
+        cursor.execute("""
+            SELECT last_id, processed, restamped
+            FROM expense_insights.reclassify_checkpoints
+            WHERE target_version = %s AND source_version = %s
+        """, (self.classifier.version, source_version or ""))
+        row = cursor.fetchone()
+        if row is None:
+            return {"last_id": 0, "processed": 0, "restamped": 0}
+        return {"last_id": row[0], "processed": row[1], "restamped": row[2]}
+
+    def _save_checkpoint(self, cursor, source_version: Optional[str],
+                         checkpoint: Dict[str, Any], status: str):
+        cursor.execute("""
+            INSERT INTO expense_insights.reclassify_checkpoints
+                (target_version, source_version, last_id, processed, restamped, status, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                last_id = VALUES(last_id), processed = VALUES(processed),
+                restamped = VALUES(restamped), status = VALUES(status),
+                updated_at = VALUES(updated_at)
+        """, (self.classifier.version, source_version or "", checkpoint["last_id"],
+              checkpoint["processed"], checkpoint["restamped"], status, self._now()))
+
+    def _reclassify_version(self, source_version: Optional[str]):
+        target_version = self.classifier.version
+        with self.app.app_context():
+            old = self._old_fingerprints(source_version)
+            changed = self._changed_categories(old)
+            rerank = self._rerankable(old)
+            checkpoint = self._load_checkpoint(source_version)
+
+        source_filter = self._source_filter(source_version)
+
+        # Rows of unchanged categories only need the new version stamped on them
+        if changed is not None:
+            category_filter = ""
+            if changed:
+                category_filter = f"AND category NOT IN ({', '.join(['%s'] * len(changed))})"
+            while True:
+                with self.app.app_context():
+                    db, cursor = get_db()
+                    cursor.execute(f"""
+                        UPDATE expense_insights.expenses
+                        SET category_version = %s
+                        WHERE category_version <=> %s AND {source_filter}
+                        AND category IS NOT NULL AND category <> ''
+                        {category_filter}
+                        LIMIT %s
+                    """, (target_version, source_version, *changed, self.chunk_size))
+                    restamped = cursor.rowcount
+                    checkpoint["restamped"] += restamped
+                    self._save_checkpoint(cursor, source_version, checkpoint, RUNNING)
+                    db.commit()
+                if restamped < self.chunk_size:
+                    break
+                time.sleep(self.pause_seconds)
+
+        # Whatever still carries the stale version goes through the classifier again
+        while True:
+            with self.app.app_context():
+                db, cursor = get_db()
+                cursor.execute(f"""
+                    SELECT id, user_id, description
+                    FROM expense_insights.expenses
+                    WHERE category_version <=> %s AND {source_filter} AND id > %s
+                    AND category IS NOT NULL AND category <> ''
+                    ORDER BY id
+                    LIMIT %s
+                """, (source_version, checkpoint["last_id"], self.chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    self._save_checkpoint(cursor, source_version, checkpoint, DONE)
+                    db.commit()
+                    return
+
+                categories = self._classify_rows(rows, rerank)
+                cases = " ".join(["WHEN %s THEN %s"] * len(categories))
+                ids = ", ".join(["%s"] * len(categories))
+                # The source and version are checked again, so a correction a
+                # user saved since the SELECT is left alone
+                cursor.execute(f"""
+                    UPDATE expense_insights.expenses
+                    SET category = CASE id {cases} END, category_version = %s,
+                        category_source = '{SOURCE_MODEL}'
+                    WHERE id IN ({ids}) AND category_version <=> %s AND {source_filter}
+                """, (*[value for pair in categories.items() for value in pair],
+                      target_version, *categories, source_version))
+                checkpoint["last_id"] = rows[-1][0]
+                checkpoint["processed"] += len(categories)
+                self._save_checkpoint(cursor, source_version, checkpoint, RUNNING)
+                db.commit()
+            time.sleep(self.pause_seconds)
+
+    def _classify_rows(self, rows, rerank: bool = False) -> Dict[int, str]:
+        """
+        Classify (id, user_id, description) rows with the current version.
+
+        User overrides and cached results are used first. With `rerank`,
+        descriptions with stored score vectors are re-ranked from them. The
+        remaining descriptions are classified once per canonical form.
+
+        Returns:
+            Dictionary mapping row ids to their new category
+        """
+        version = self.classifier.version
+        by_user: Dict[str, List[str]] = {}
+        for _, user_id, description in rows:
+            by_user.setdefault(user_id, []).append(description)
+        known = {user_id: description_cache.lookup(user_id, descriptions, version)
+                 for user_id, descriptions in by_user.items()}
+
+        pending = {}
+        for _, user_id, description in rows:
+            if description not in known[user_id]:
+                pending.setdefault(canonicalize_description(description), description)
+        results = {}
+        if pending and rerank:
+            stored = score_store.load(list(pending.values()), self.classifier.score_version)
+            results.update(zip(stored, self.classifier.rerank(list(stored.values()))))
+        remaining = [description for description in pending.values()
+                     if description not in results]
+        if remaining:
+            classified = self.engine.classify_detailed(remaining)
+            results.update(zip(remaining, classified))
+            scores = {description: result["scores"]
+                      for description, result in zip(remaining, classified) if "scores" in result}
+            if scores:
+                score_store.store(scores, self.classifier.score_version)
+        if results:
+            description_cache.store(
+                {description: result["category"] for description, result in results.items()},
+                version,
+                {description: result["confidence"] for description, result in results.items()})
+        classified = {key: results[description]["category"]
+                      for key, description in pending.items()}
+
+        return {
+            row_id: known[user_id].get(description)
+            or classified[canonicalize_description(description)]
+            for row_id, user_id, description in rows
+        }
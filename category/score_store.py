@@ -0,0 +1,101 @@
+import datetime
+from typing import Dict, List, Tuple
+import numpy as np
+from db import get_db
+from normalization import canonicalize_description
+
+
+class ScoreStore:
+    """
+    Persistent per-description zero-shot and few-shot score vectors.
+
+    Vectors are stored as float16 blobs in the `score_vectors` table, keyed
+    by canonical description and the classifier's score_version, which
+    leaves out weights and thresholds. Scores are in the version's category
+    order, and categories pruned before NLI hold NaN. When only the weights
+    change, the reclassifier re-ranks stored vectors through
+    ExpenseClassifier.rerank instead of running the models again.
+    """
+
+    def __init__(self, chunk_size: int = 500):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _decode(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+    def store(self, scores: Dict[str, Tuple[np.ndarray, np.ndarray]], version: str) -> None:
+        """
+        Save score vectors for a score version.
+
+        Args:
+            scores: Dictionary mapping descriptions to (zero_shot, few_shot) vectors
+            version: Score version of the classifier that produced the scores
+        """
+        now = datetime.datetime.now().replace(microsecond=0)
+        rows = {}
+        for description, (zero_shot, few_shot) in scores.items():
+            rows[canonicalize_description(description)] = (
+                np.asarray(zero_shot, dtype=np.float16).tobytes(),
+                np.asarray(few_shot, dtype=np.float16).tobytes())
+        if not rows:
+            return
+
+        query = """
+            INSERT INTO expense_insights.score_vectors
+            (description_key, score_version, zero_shot, few_shot, updated_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE zero_shot = VALUES(zero_shot),
+                                    few_shot = VALUES(few_shot),
+                                    updated_at = VALUES(updated_at)
+        """
+        db, cursor = None, None
+        try:
+            db, cursor = get_db()
+            cursor.executemany(query, [(key, version, zero_shot, few_shot, now)
+                                       for key, (zero_shot, few_shot) in rows.items()])
+            db.commit()
+        except Exception as e:
+            print(f"Error writing score vectors: {e}")
+            if db:
+                db.rollback()
+
+    def load(self, descriptions: List[str],
+             version: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Fetch stored score vectors for descriptions.
+
+        Args:
+            descriptions: Raw descriptions
+            version: Score version the scores must come from
+
+        Returns:
+            Dictionary mapping each description with stored scores to its
+            (zero_shot, few_shot) vectors
+        """
+        keys = {}
+        for description in descriptions:
+            keys.setdefault(canonicalize_description(description), []).append(description)
+
+        found = {}
+        key_list = list(keys)
+        db, cursor = None, None
+        try:
+            db, cursor = get_db()
+            for i in range(0, len(key_list), self.chunk_size):
+                chunk = key_list[i:i + self.chunk_size]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT description_key, zero_shot, few_shot
+                    FROM expense_insights.score_vectors
+                    WHERE score_version = %s AND description_key IN ({placeholders})
+                """, (version, *chunk))
+                for key, zero_shot, few_shot in cursor.fetchall():
+                    for description in keys[key]:
+                        found[description] = (self._decode(zero_shot), self._decode(few_shot))
+        except Exception as e:
+            print(f"Error reading score vectors: {e}")
+        return found
+
+
+score_store = ScoreStore()
@@ -0,0 +1,61 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+def combine_scores(zero_shot: np.ndarray, few_shot: np.ndarray,
+                   few_shot_weight: float) -> np.ndarray:
+    """
+    Weighted average of zero-shot and few-shot scores.
+
+    Categories whose zero-shot score is NaN (pruned before NLI) score -inf,
+    so they can never win.
+
+    Args:
+        zero_shot: Zero-shot scores of shape (..., categories)
+        few_shot: Few-shot scores of the same shape
+        few_shot_weight: Weight of the few-shot scores, between 0 and 1
+
+    Returns:
+        Combined scores of the same shape
+    """
+    zero_shot = np.asarray(zero_shot, dtype=np.float32)
+    few_shot = np.asarray(few_shot, dtype=np.float32)
+    combined = (1 - few_shot_weight) * zero_shot + few_shot_weight * few_shot
+    return np.where(np.isnan(zero_shot), -np.inf, combined)
+
+
+def rerank(zero_shot: np.ndarray, few_shot: np.ndarray, categories: List[str],
+           few_shot_weight: float = 0.7, min_confidence: Optional[float] = None,
+           fallback: Optional[str] = None) -> List[Tuple[Optional[str], float]]:
+    """
+    Pick categories again from stored score vectors, without running any model.
+
+    Args:
+        zero_shot: Zero-shot scores of shape (n, categories)
+        few_shot: Few-shot scores of shape (n, categories)
+        categories: Category names in score order (the version's category list)
+        few_shot_weight: Weight of the few-shot scores
+        min_confidence: Optional threshold; rows whose best combined score is
+            below it get `fallback` instead of their best category
+        fallback: Category for rows below min_confidence
+
+    Returns:
+        List of (category, confidence) pairs
+    """
+    combined = combine_scores(zero_shot, few_shot, few_shot_weight)
+    if not combined.size:
+        return []
+    best = combined.argmax(axis=1)
+    confidences = combined[np.arange(len(combined)), best]
+    return [
+        (fallback if min_confidence is not None and confidence < min_confidence
+         else categories[index], float(confidence))
+        for index, confidence in zip(best, confidences)
+    ]
+
+
+def confidence_scores(zero_shot: np.ndarray, few_shot: np.ndarray, categories: List[str],
+                      few_shot_weight: float = 0.7) -> Dict[str, float]:
+    """Per-category combined scores of one stored description, like get_confidence_scores."""
+    combined = combine_scores(zero_shot, few_shot, few_shot_weight)
+    return {category: float(score) for category, score in zip(categories, combined)}
@@ -0,0 +1,68 @@
+import os
+import pytest
+import yaml
+from keyword_matcher import KeywordMatcher, load_merchant_keywords
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+
+
+@pytest.fixture(scope="module")
+def shipped_matcher():
+    with open(CONFIG_PATH) as file:
+        config = yaml.safe_load(file)
+    return KeywordMatcher(load_merchant_keywords(config["merchants"]))
+
+
+@pytest.mark.parametrize("description", [
+    "The Irish Pub",
+    "Penguin Publishing",
+    "PUBLIC LIBRARY",
+    "IRSHAD RESTAURANT",
+    "GSTAAD HOTEL",
+    "Gianteagle",
+    "FIRST CAPITAL",
+    "NTUC Income Insurance",
+    "NTUC Health Clinic",
+    "NTUC Foodfare Kopitiam",
+])
+def test_shipped_keywords_do_not_match_inside_words(shipped_matcher, description):
+    assert shipped_matcher.match(description) is None
+
+
+@pytest.mark.parametrize("description, category", [
+    ("IRASITXSjhdddA", "tax"),
+    ("IRS PAYMENT", "tax"),
+    ("GST 2024 Q1", "tax"),
+    ("GRAB*RIDE 8823 SG", "transport"),
+    ("UBER EATS 1234", "dining"),
+    ("Giant Hypermarket Tampines", "groceries"),
+    ("NTUC FairPrice Tampines", "groceries"),
+    ("FAIRPRICE XTRA", "groceries"),
+])
+def test_shipped_keywords_match(shipped_matcher, description, category):
+    assert shipped_matcher.match(description) == category
+
+
+def test_keyword_must_end_at_word_boundary():
+    matcher = KeywordMatcher({"PUB": "Utilities"})
+    assert matcher.match("PUB 1234") == "Utilities"
+    assert matcher.match("Penguin Publishing") is None
+
+
+def test_prefix_keyword_runs_into_following_characters():
+    matcher = KeywordMatcher({"IRAS*": "Tax"})
+    assert matcher.match("IRASITXS") == "Tax"
+    assert matcher.match("IRAS") == "Tax"
+    assert matcher.match("KIRAS") is None
+
+
+def test_keyword_ending_in_punctuation_needs_no_boundary():
+    matcher = KeywordMatcher({"Disney+": "Entertainment"})
+    assert matcher.match("DISNEY+HOTSTAR") == "Entertainment"
+
+
+def test_longer_hit_wins_and_conflicts_are_ambiguous():
+    matcher = KeywordMatcher({"Uber": "Transport", "Uber Eats": "Dining", "Grab": "Transport",
+                              "NTUC": "Groceries"})
+    assert matcher.match("UBER EATS SG") == "Dining"
+    assert matcher.match("GRAB NTUC") is None
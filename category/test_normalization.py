@@ -0,0 +1,32 @@
+import pytest
+from normalization import canonicalize_description
+
+
+@pytest.mark.parametrize("description, canonical", [
+    ("GRAB*RIDE 8823 SG", "grab ride"),
+    ("Grab Ride 1190", "grab ride"),
+    ("M1 Bill", "m1 bill"),
+    ("M1 BILL 04/2024", "m1 bill"),
+    ("7-ELEVEN 1234", "7eleven"),
+    ("7-Eleven 5678 SG", "7eleven"),
+    ("STARBUCKS #1234", "starbucks"),
+    ("NETFLIX.COM 866-579-7172", "netflix"),
+    ("SHOPEE REF 12345678", "shopee"),
+    ("COLD STORAGE *4321 12/03", "cold storage"),
+    ("AMAZON MKTP US*2K3L45", "amazon mktp"),
+    ("POS T12345 SHENG SIONG", "pos sheng siong"),
+    ("McDonald's 0231", "mcdonalds"),
+    ("12345", "12345"),
+])
+def test_canonical_keys(description, canonical):
+    assert canonicalize_description(description) == canonical
+
+
+@pytest.mark.parametrize("first, second, same", [
+    ("M1 Bill", "SP Group Bill", False),
+    ("M1 Bill", "Bill", False),
+    ("7-ELEVEN 1234", "7-ELEVEN 9876", True),
+    ("Grab Ride 1190", "GRAB*RIDE 8823 SG", True),
+])
+def test_grouping(first, second, same):
+    assert (canonicalize_description(first) == canonicalize_description(second)) is same
@@ -0,0 +1,169 @@
+"""
+Train a logistic classification head on MiniLM embeddings of labeled descriptions.
+
+Training data is the categorized rows of the expenses table, the users'
+category overrides and the config examples. Most rows were labeled by the
+classifier itself, so the holdout that compares the head with the current
+ExpenseClassifier is drawn only from descriptions a user labeled: cache
+overrides and rows corrected in the editor. The head is saved as <output-dir>/head-<version>.npz. To serve it, set
+`classifier.head` in config.yaml to that path.
+
+Usage:
+    python train_head.py [--config config.yaml] [--output-dir heads]
+"""
+import argparse
+import json
+import os
+from collections import Counter
+import MySQLdb
+import numpy as np
+from classification_head import ClassificationHead
+from expense_classifier import ExpenseClassifier
+from inference_backend import INFERENCE_BACKEND
+from normalization import canonicalize_description
+
+
+def connect():
+    return MySQLdb.connect(
+        host=os.getenv("MYSQL_HOST", "host.docker.internal"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        user=os.getenv("MYSQL_USER", "remote_user"),
+        passwd=os.getenv("MYSQL_PASSWORD", "Str0ng@Pass123"),
+        db=os.getenv("MYSQL_DB", "expense_insights"),
+    )
+
+
+def load_labeled_rows(categories, limit):
+    """
+    Fetch labeled descriptions from categorized expenses and user overrides.
+
+    Returns:
+        One (description, category, user_labeled) tuple per canonical
+        description, with its most frequent category. user_labeled is True
+        when a user set the category through an override or a correction.
+    """
+    placeholders = ", ".join(["%s"] * len(categories))
+    connection = connect()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT description, category, COUNT(*), category_source = 'user'
+            FROM expense_insights.expenses
+            WHERE category IN ({placeholders})
+            GROUP BY description, category, category_source = 'user'
+            ORDER BY MAX(id) DESC
+            LIMIT %s
+        """, (*categories, limit))
+        rows = list(cursor.fetchall())
+        # A user's override is a correction, so it counts as many votes
+        cursor.execute(f"""
+            SELECT description_key, category, 1000, 1
+            FROM expense_insights.category_cache
+            WHERE user_id <> '' AND category IN ({placeholders})
+        """, tuple(categories))
+        rows += list(cursor.fetchall())
+    finally:
+        connection.close()
+
+    votes = {}
+    texts = {}
+    user_labeled = set()
+    for description, category, count, corrected in rows:
+        key = canonicalize_description(description)
+        if corrected:
+            # Corrections in the editor outweigh the classifier's own labels
+            count *= 1000
+            user_labeled.add(key)
+        votes.setdefault(key, Counter())[category] += count
+        texts.setdefault(key, description)
+    return [(texts[key], counter.most_common(1)[0][0], key in user_labeled)
+            for key, counter in votes.items()]
+
+
+def accuracy(predicted, gold):
+    return float(np.mean([p == g for p, g in zip(predicted, gold)])) if gold else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default=os.getenv("CLASSIFIER_CONFIG", "config.yaml"))
+    parser.add_argument("--output-dir", default="heads")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="Share of user-labeled descriptions held out for evaluation")
+    parser.add_argument("--limit", type=int, default=200000,
+                        help="Most (description, category) rows read from expenses")
+    parser.add_argument("--max-eval", type=int, default=500,
+                        help="Most holdout rows run through the current classifier")
+    parser.add_argument("--regularization", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    classifier = ExpenseClassifier(
+        args.config,
+        classification_model=os.getenv("CLASSIFICATION_MODEL",
+                                       "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"),
+        embedding_model=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+        backend=INFERENCE_BACKEND,
+    )
+    categories = classifier.categories
+
+    labeled = load_labeled_rows(categories, args.limit)
+    # Holding out classifier-labeled rows would measure the classifier's
+    # agreement with itself, so only user labels are held out
+    user_labeled = [(text, category) for text, category, by_user in labeled if by_user]
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(user_labeled))
+    holdout_size = int(len(user_labeled) * args.holdout)
+    holdout = [user_labeled[i] for i in order[:holdout_size]]
+    train = [user_labeled[i] for i in order[holdout_size:]]
+    train += [(text, category) for text, category, by_user in labeled if not by_user]
+
+    # Config examples always train; they are what the classifier already knows
+    train += [(example["transaction"], example["category"]) for example in classifier.examples
+              if example.get("category") in categories and "transaction" in example]
+    if len({category for _, category in train}) < 2:
+        raise SystemExit("Need labeled descriptions in at least two categories to train")
+
+    train_texts, train_labels = zip(*train)
+    head = ClassificationHead.train(
+        classifier._encode(list(train_texts)), list(train_labels), categories,
+        classifier.embedding_model, classifier.backend, args.regularization)
+
+    report = {
+        "train_samples": len(train),
+        "holdout_samples": len(holdout),
+        "user_labeled_samples": len(user_labeled),
+        "label_counts": dict(Counter(train_labels)),
+        "head_min_confidence": classifier.head_min_confidence,
+    }
+    if holdout:
+        holdout_texts, holdout_labels = (list(values) for values in zip(*holdout))
+        probabilities = head.predict_proba(classifier._encode(holdout_texts))
+        predicted = [categories[i] for i in probabilities.argmax(axis=1)]
+        confident = probabilities.max(axis=1) >= classifier.head_min_confidence
+        report["head_accuracy"] = accuracy(predicted, holdout_labels)
+        report["head_coverage"] = float(confident.mean())
+        report["head_confident_accuracy"] = accuracy(
+            [p for p, c in zip(predicted, confident) if c],
+            [g for g, c in zip(holdout_labels, confident) if c])
+
+        evaluated = holdout_texts[:args.max_eval]
+        report["classifier_eval_samples"] = len(evaluated)
+        report["head_accuracy_on_classifier_eval"] = accuracy(
+            predicted[:len(evaluated)], holdout_labels[:len(evaluated)])
+        report["classifier_accuracy"] = accuracy(
+            classifier.classify(evaluated), holdout_labels[:len(evaluated)])
+
+    else:
+        print("No user-labeled descriptions to hold out; accuracy is not reported")
+
+    head.metadata = report
+    path = head.save(args.output_dir)
+    report["version"] = head.version
+    report["path"] = path
+    print(json.dumps(report, indent=2))
+    print(f"\nTo serve this head, set `head: {path}` under `classifier:` in {args.config}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import gc
+import math
+import multiprocessing
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import inference_backend
+from expense_classifier import ExpenseClassifier
+from profiler import metrics
+
+# Set in the parent before forking, so every worker inherits the loaded models
+_classifier: Optional[ExpenseClassifier] = None
+
+
+def prepare_fork():
+    """
+    Keep the parent's inference libraries single-threaded until the pool forks.
+
+    Thread pools of GNU OpenMP (used by PyTorch), ONNX Runtime and the
+    tokenizers do not survive a fork. A worker forked after the parent
+    started them can hang on its first forward pass. Call this before any
+    model is loaded or run. ONNX Runtime sessions keep the single thread
+    in the workers too, so size CLASSIFY_PROCESSES to the cores with that backend.
+    """
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    inference_backend.INFERENCE_THREADS = 1
+    if inference_backend.INFERENCE_BACKEND == "torch":
+        import torch
+        torch.set_num_threads(1)
+
+
+def _init_worker(threads: int):
+    # Each worker gets its share of the cores instead of all of them
+    if _classifier.backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    # Drop the metrics inherited from the parent; they are already counted there
+    metrics.drain()
+
+
+def _classify_shard(shard: List[str],
+                    batch_size: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    results = _classifier.classify_detailed(shard, batch_size)
+    # The worker's timings and counters go back with the results
+    return results, metrics.drain()
+
+
+class ClassifierPool:
+    """
+    Pool of pre-forked worker processes that classify shards of descriptions.
+
+    The pool must be created after the classifier has loaded its models and
+    before any other threads start, with prepare_fork() called before the
+    models load. The workers are forked from that process, so they share
+    the model weights copy-on-write and do not load them again. Examples or
+    rules added to the classifier after the fork are not seen by the
+    workers. Each shard's profile is merged into the classifier's profiler,
+    so the process-wide metrics include the workers' stages.
+    """
+
+    def __init__(self, classifier: ExpenseClassifier, processes: int, shard_size: int = 16):
+        """
+        Args:
+            classifier: Fully loaded classifier the workers will use
+            processes: Number of worker processes
+            shard_size: Descriptions each worker should get per call; sets batch_size
+        """
+        global _classifier
+        _classifier = classifier
+        self.classifier = classifier
+        self.processes = processes
+        self.shard_size = shard_size
+        # Enough descriptions per call to keep every worker busy; callers
+        # that batch (the InferenceScheduler) should send at least this many
+        self.batch_size = processes * shard_size
+
+        threads = max(1, (os.cpu_count() or 1) // processes)
+
+        # Move the loaded objects out of the garbage collector's reach, so
+        # collections in the workers don't touch (and copy) their pages
+        gc.freeze()
+        context = multiprocessing.get_context("fork")
+        self._pool = context.Pool(processes, initializer=_init_worker, initargs=(threads,))
+
+    def classify_detailed(self, transactions: List[str],
+                          batch_size: int = 16) -> List[Dict[str, Any]]:
+        """
+        Classify descriptions across the worker processes.
+
+        Each call is split into one even shard per process, so every worker
+        has work however many descriptions the call brings.
+
+        Args:
+            transactions: List of transaction descriptions
+            batch_size: Forward-pass batch size inside each worker
+
+        Returns:
+            The same results as ExpenseClassifier.classify_detailed, in input order
+        """
+        size = max(1, math.ceil(len(transactions) / self.processes))
+        shards = [transactions[i:i + size] for i in range(0, len(transactions), size)]
+        results = []
+        for shard_results, profile in self._pool.starmap(
+                _classify_shard, [(shard, batch_size) for shard in shards]):
+            results.extend(shard_results)
+            self.classifier.profiler.merge(profile)
+        return results
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
@@ -10,10 +10,14 @@ CREATE TABLE IF NOT EXISTS `expenses` (
   `currency_code` VARCHAR(45) NOT NULL,
   `description` VARCHAR(100) NOT NULL,
   `category` VARCHAR(45) DEFAULT NULL,
+  `category_version` VARCHAR(45) DEFAULT NULL,
+  `category_source` VARCHAR(10) DEFAULT NULL,
   `date` DATE NOT NULL,
   `created_at` DATETIME NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `idx_unique_expense` (`user_id`,`expense`,`currency_code`,`description`)
+  UNIQUE KEY `idx_unique_expense` (`user_id`,`expense`,`currency_code`,`description`),
+  KEY `idx_expenses_file_description` (`user_id`,`file_id`,`description`),
+  KEY `idx_expenses_category_version` (`category_version`,`id`)
 );
 
 CREATE TABLE IF NOT EXISTS `upload_history` (
@@ -22,6 +26,8 @@ CREATE TABLE IF NOT EXISTS `upload_history` (
   `file_name` VARCHAR(45) NOT NULL,
   `status` VARCHAR(45) NOT NULL,
   `message` VARCHAR(45) DEFAULT NULL,
+  `rows_processed` INT NOT NULL DEFAULT 0,
+  `duplicates_ignored` INT NOT NULL DEFAULT 0,
   `uploaded_at` DATETIME DEFAULT NULL,
   PRIMARY KEY (`id`)
 );
@@ -32,4 +38,49 @@ CREATE TABLE IF NOT EXISTS `users` (
     email VARCHAR(100) UNIQUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_login_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS `category_cache` (
+  `user_id` VARCHAR(45) NOT NULL DEFAULT '',
+  `description_key` VARCHAR(100) NOT NULL,
+  `config_version` VARCHAR(45) NOT NULL DEFAULT '',
+  `category` VARCHAR(45) NOT NULL,
+  `confidence` FLOAT DEFAULT NULL,
+  `updated_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`description_key`,`user_id`,`config_version`)
+);
+
+CREATE TABLE IF NOT EXISTS `classifier_versions` (
+  `version` VARCHAR(45) NOT NULL,
+  `fingerprints` TEXT NOT NULL,
+  `created_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`version`)
+);
+
+CREATE TABLE IF NOT EXISTS `reclassify_checkpoints` (
+  `target_version` VARCHAR(45) NOT NULL,
+  `source_version` VARCHAR(45) NOT NULL DEFAULT '',
+  `last_id` INT NOT NULL DEFAULT 0,
+  `processed` INT NOT NULL DEFAULT 0,
+  `restamped` INT NOT NULL DEFAULT 0,
+  `status` VARCHAR(45) NOT NULL,
+  `updated_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`target_version`,`source_version`)
+);
+
+CREATE TABLE IF NOT EXISTS `score_vectors` (
+  `description_key` VARCHAR(100) NOT NULL,
+  `score_version` VARCHAR(45) NOT NULL,
+  `zero_shot` VARBINARY(512) NOT NULL,
+  `few_shot` VARBINARY(512) NOT NULL,
+  `updated_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`score_version`,`description_key`)
+);
+
+CREATE TABLE IF NOT EXISTS `classifier_examples` (
+  `description_key` VARCHAR(100) NOT NULL,
+  `transaction_text` VARCHAR(255) NOT NULL,
+  `category` VARCHAR(45) NOT NULL,
+  `updated_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`description_key`)
+);
@@ -0,0 +1,18 @@
+-- Upgrades a database created from an older init.sql. Run it once, then run
+-- init.sql again to create the tables added since (it only creates what is missing).
+
+USE expense_insights;
+
+-- Classifier version and origin ('model' or 'user') of each stored category.
+-- Existing rows keep both NULL: they are legacy rows, which reclassification
+-- only touches when a backfill is requested (POST /reclassify {"backfill": true}).
+ALTER TABLE `expenses`
+  ADD COLUMN `category_version` VARCHAR(45) DEFAULT NULL AFTER `category`,
+  ADD COLUMN `category_source` VARCHAR(10) DEFAULT NULL AFTER `category_version`,
+  ADD KEY `idx_expenses_file_description` (`user_id`,`file_id`,`description`),
+  ADD KEY `idx_expenses_category_version` (`category_version`,`id`);
+
+-- Upload progress and bulk-load statistics
+ALTER TABLE `upload_history`
+  ADD COLUMN `rows_processed` INT NOT NULL DEFAULT 0 AFTER `message`,
+  ADD COLUMN `duplicates_ignored` INT NOT NULL DEFAULT 0 AFTER `rows_processed`;
@@ -23,7 +23,7 @@ def upload_csv():
         else:
             file_uploader = FileUploader(
                 file, file_name, file_meta_data_provider[file_name], user_id)
-            return file_uploader.validate_and_insert()
+            return file_uploader.validate_and_queue()
 
 
 @api_bp.route('/file/gethistory', methods=['GET'])
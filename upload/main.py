@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 import requests
 from db import init_db, close_db
 from api import api_bp
+from process.upload_worker import upload_worker
 import os
 
 
@@ -13,9 +14,13 @@ app.config["MYSQL_PORT"] = int(os.getenv("MYSQL_PORT", 3306))
 app.config["MYSQL_USER"] = os.getenv("MYSQL_USER", "remote_user")
 app.config["MYSQL_PASSWORD"] = os.getenv("MYSQL_PASSWORD", "Str0ng@Pass123")
 app.config["MYSQL_DB"] = os.getenv("MYSQL_DB", "expense_insights")
+# Lets the bulk loader use LOAD DATA LOCAL INFILE
+app.config["MYSQL_CUSTOM_OPTIONS"] = {"local_infile": 1}
 
 init_db(app)
 app.register_blueprint(api_bp, url_prefix="/api")
+upload_worker.fail_interrupted(app)
+upload_worker.start_categorization_watch(app)
 
 
 @app.route('/health')
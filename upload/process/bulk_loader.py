@@ -0,0 +1,152 @@
+import itertools
+import os
+import tempfile
+import time
+
+# "auto" picks LOAD DATA for large chunks and multi-row INSERT otherwise
+UPLOAD_BULK_STRATEGY = os.getenv("UPLOAD_BULK_STRATEGY", "auto")
+UPLOAD_ROWS_PER_STATEMENT = int(os.getenv("UPLOAD_ROWS_PER_STATEMENT", 1000))
+UPLOAD_LOAD_DATA_MIN_ROWS = int(os.getenv("UPLOAD_LOAD_DATA_MIN_ROWS", 5000))
+
+# MySQL errors meaning LOAD DATA LOCAL is disabled or refused: not allowed
+# with this MySQL version (1148), local data disabled on the server (3948)
+# and LOCAL INFILE rejected by the client (2068)
+LOCAL_INFILE_REFUSED_ERRORS = (1148, 3948, 2068)
+
+
+def is_local_infile_refused(error):
+    return bool(error.args) and error.args[0] in LOCAL_INFILE_REFUSED_ERRORS
+
+
+class MultiRowInsert:
+    """
+    INSERT IGNORE with many rows per statement, one round trip per statement.
+    """
+
+    name = "multi_row"
+
+    def __init__(self, rows_per_statement=UPLOAD_ROWS_PER_STATEMENT):
+        self.rows_per_statement = rows_per_statement
+
+    def load(self, cursor, table, column_names, data_frame):
+        """
+        Insert the rows of a data frame, ignoring duplicates.
+
+        Returns:
+            Number of rows actually inserted
+        """
+        row_placeholder = f"({', '.join(['%s'] * len(column_names))})"
+        rows = data_frame.itertuples(index=False, name=None)
+        inserted = 0
+        for _ in range(0, len(data_frame), self.rows_per_statement):
+            batch = [value for row in itertools.islice(rows, self.rows_per_statement)
+                     for value in row]
+            row_count = len(batch) // len(column_names)
+            cursor.execute(f"""
+                INSERT IGNORE INTO {table} ({', '.join(column_names)})
+                VALUES {', '.join([row_placeholder] * row_count)}
+            """, batch)
+            inserted += cursor.rowcount
+        return inserted
+
+
+class LoadDataInfile:
+    """
+    LOAD DATA LOCAL INFILE from a temporary CSV file.
+
+    The client library reads LOCAL INFILE from a path, so each chunk is
+    written to a temporary file first. Needs local_infile enabled on both
+    the server and the connection (MYSQL_CUSTOM_OPTIONS in main.py).
+    """
+
+    name = "load_data"
+
+    def load(self, cursor, table, column_names, data_frame):
+        """
+        Load the rows of a data frame, ignoring duplicates.
+
+        Returns:
+            Number of rows actually inserted
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="",
+                                         encoding="utf-8") as buffer:
+            data_frame[column_names].to_csv(buffer, index=False, header=False,
+                                            lineterminator="\n")
+            buffer.flush()
+            cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {table}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                ({', '.join(column_names)})
+            """, (buffer.name,))
+            return cursor.rowcount
+
+
+class BulkLoader:
+    """
+    Inserts data frames with the strategy that suits their size and keeps load statistics.
+
+    With the "auto" strategy, chunks of at least UPLOAD_LOAD_DATA_MIN_ROWS
+    rows go through LOAD DATA and smaller ones through multi-row INSERT.
+    If the server or client refuses LOAD DATA LOCAL, this loader falls back
+    to multi-row INSERT for the rest of its upload. Any other error is raised.
+    """
+
+    def __init__(self, strategy=UPLOAD_BULK_STRATEGY,
+                 load_data_min_rows=UPLOAD_LOAD_DATA_MIN_ROWS):
+        self.strategy = strategy
+        self.load_data_min_rows = load_data_min_rows
+        self.load_data_available = True
+        self.multi_row = MultiRowInsert()
+        self.load_data = LoadDataInfile()
+        self.rows_loaded = 0
+        self.rows_inserted = 0
+        self.seconds = 0.0
+
+    def choose(self, row_count):
+        if self.strategy == "multi_row" or not self.load_data_available:
+            return self.multi_row
+        if self.strategy == "load_data" or row_count >= self.load_data_min_rows:
+            return self.load_data
+        return self.multi_row
+
+    def load(self, db, cursor, table, column_names, data_frame):
+        """
+        Insert a data frame and commit.
+
+        Args:
+            db: Database connection
+            cursor: Cursor on that connection
+            table: Qualified table name
+            column_names: Columns to insert, in data frame order
+            data_frame: Rows to insert
+
+        Returns:
+            Number of rows actually inserted
+        """
+        start = time.perf_counter()
+        strategy = self.choose(len(data_frame))
+        try:
+            inserted = strategy.load(cursor, table, column_names, data_frame)
+        except Exception as e:
+            if strategy is not self.load_data or not is_local_infile_refused(e):
+                raise
+            print(f"LOAD DATA LOCAL refused, using multi-row INSERT instead: {e}")
+            db.rollback()
+            self.load_data_available = False
+            inserted = self.multi_row.load(cursor, table, column_names, data_frame)
+        db.commit()
+
+        self.seconds += time.perf_counter() - start
+        self.rows_loaded += len(data_frame)
+        self.rows_inserted += inserted
+        return inserted
+
+    @property
+    def duplicates_ignored(self):
+        return self.rows_loaded - self.rows_inserted
+
+    @property
+    def rows_per_second(self):
+        return self.rows_loaded / self.seconds if self.seconds else 0.0
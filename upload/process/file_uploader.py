@@ -1,9 +1,15 @@
 from flask import jsonify
 from db import get_db
+from process.bulk_loader import BulkLoader
+from process.upload_worker import upload_worker
 import pandas as pd
 import datetime
+import os
 import requests
 
+# Rows read, transformed and inserted at a time, so memory stays bounded
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", 10000))
+
 
 class FileUploader:
 
@@ -13,46 +19,105 @@ class FileUploader:
         self.file_meta_data = file_meta_data
         self.user_id = user_id
         self.file_id = -1
+        self.rows_processed = 0
+        self.duplicates_ignored = 0
+        self.source_columns = {}
 
-    def validate_and_insert(self):
+    def validate_and_queue(self):
+        """
+        Validate the headers, then spool the file and queue it for background processing.
 
+        Returns:
+            202 with the upload's file_id, or an error response
+        """
         try:
-            file = self.file
-            file_name = self.file_name
             file_meta_data = self.file_meta_data
-            user_id = self.user_id
 
             required_headers = file_meta_data['required_headers']
-            data_frame = pd.read_csv(file)
-
-            data_frame.columns = data_frame.columns.str.lower()
-
-            if 'header_mapping' in file_meta_data:
-                self.header_mapping(data_frame, file_meta_data)
+            # Only the header row is read here; rows are parsed in the background
+            self.source_columns = self.read_headers(file_meta_data)
 
             missing_columns = [
-                col for col in required_headers if col not in data_frame.columns]
+                col for col in required_headers if col not in self.source_columns]
             if missing_columns:
                 self.insert_upload_history(
                     "FAILED", "Missing columns: " + ', '.join(missing_columns))
                 return jsonify({'status': 'error', 'message': 'Missing columns: ' + ', '.join(missing_columns)}), 400
 
+            upload_history_response = self.insert_upload_history(
+                "QUEUED", "waiting to be processed")
+            if upload_history_response.json['status'] == "error":
+                return jsonify({'status': 'error', 'message': 'Upload error'}), 500
+
+            self.file = upload_worker.spool(self.file)
+            upload_worker.submit(self)
+            return jsonify({'status': 'success', 'message': 'file accepted for processing',
+                            'file_id': self.file_id}), 202
+
+        except Exception as e:
+            print(e)
+            self.fail_upload_history("internal server error")
+            return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+
+    def process(self):
+        """Parse and insert the spooled file, then hand it off for categorization."""
+        try:
+            self.update_upload_history("PARSING", "parsing file")
+            self.insert_to_db(self.read_chunks(self.source_columns), self.file_meta_data)
+        except Exception as e:
+            print(e)
+            self.fail_upload_history("internal server error")
+
+    def read_headers(self, file_meta_data):
+        """
+        Read only the header row and map each target column to its column in the file.
+
+        Returns:
+            Dictionary of target column name (lower-cased, after header_mapping)
+            to the file's own column name
+        """
+        header_frame = pd.read_csv(self.file, nrows=0)
+        self.file.seek(0)
+        header_mapping = file_meta_data.get('header_mapping', {})
+        source_columns = {}
+        for column in header_frame.columns:
+            target = header_mapping.get(column.lower(), column.lower())
+            source_columns.setdefault(target, column)
+        return source_columns
+
+    def read_chunks(self, source_columns):
+        """
+        Parse the file in chunks of UPLOAD_CHUNK_ROWS rows, ready for insertion.
+
+        Only the required columns are parsed, with the dtypes from the file
+        metadata, and each chunk gets the common fields added.
+        """
+        file_meta_data = self.file_meta_data
+        required_headers = file_meta_data['required_headers']
+        dtypes = file_meta_data.get('dtypes', {})
+        created_at = datetime.datetime.now().replace(microsecond=0)
+
+        reader = pd.read_csv(
+            self.file,
+            usecols=[source_columns[col] for col in required_headers],
+            dtype={source_columns[col]: dtypes[col] for col in required_headers if col in dtypes},
+            chunksize=UPLOAD_CHUNK_ROWS)
+        for data_frame in reader:
+            data_frame.columns = data_frame.columns.str.lower()
+
+            if 'header_mapping' in file_meta_data:
+                self.header_mapping(data_frame, file_meta_data)
+
             data_frame = data_frame[required_headers].dropna()
 
             # common fileds
 
-            data_frame["user_id"] = user_id
-            data_frame["created_at"] = datetime.datetime.now().replace(
-                microsecond=0)
+            data_frame["user_id"] = self.user_id
+            data_frame["created_at"] = created_at
 
             if 'empty_fields_to_add' in file_meta_data:
                 self.add_empty_fields(data_frame, file_meta_data)
-            return self.insert_to_db(data_frame, file_meta_data)
-
-        except Exception as e:
-            print(e)
-            self.insert_upload_history("FAILED", "internal server error")
-            return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+            yield data_frame
 
     def header_mapping(self, data_frame, file_meta_data):
         header_mapping = file_meta_data['header_mapping']
@@ -64,37 +129,41 @@ class FileUploader:
         for field in empty_fields_to_add:
             data_frame[field] = ""
 
-    def insert_to_db(self, data_frame, file_meta_data):
+    def insert_to_db(self, data_frames, file_meta_data):
+        db, cursor = get_db()
+        sql_table_name = file_meta_data['sql_table_name']
+        sql_schema_name = file_meta_data['sql_schema_name']
+        sql_column_names = file_meta_data['sql_column_names']
+        bulk_loader = BulkLoader()
 
-        try:
-            db, cursor = get_db()
-            sql_table_name = file_meta_data['sql_table_name']
-            sql_schema_name = file_meta_data['sql_schema_name']
-            sql_column_names = file_meta_data['sql_column_names']
-            upload_history_response = self.insert_upload_history(
-                "PROCESSING", "upload in progress")
-            if upload_history_response.json['status'] == "error":
-                return jsonify({'status': 'error', 'message': 'Upload error'}), 500
-            file_id = upload_history_response.json['history_id']
+        # One transaction per chunk; progress is visible in upload_history
+        for data_frame in data_frames:
             data_frame['file_id'] = self.file_id
-            insert_query = f"""
-                INSERT IGNORE INTO {sql_schema_name}.{sql_table_name} ({', '.join(sql_column_names)}) 
-                VALUES ({', '.join(['%s'] * len(sql_column_names))})
-            """
-            data_frame = data_frame[sql_column_names]
-            data_to_insert = [tuple(row) for row in data_frame.to_numpy()]
-            cursor.executemany(insert_query, data_to_insert)
-
-            db.commit()
-            self.update_upload_history("SUCCESS", "uploaded successfully")
-            if 'categorize' in file_meta_data:
-                self.categorize_expenses()
-            # cursor.close()
-            return jsonify({'status': 'success', 'message': 'file uploaded successfully!'}), 200
-        except Exception as e:
-            print(e)
-            self.insert_upload_history("FAILED", "internal server error")
-            return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+            bulk_loader.load(db, cursor, f"{sql_schema_name}.{sql_table_name}",
+                             sql_column_names, data_frame[sql_column_names])
+            self.rows_processed += len(data_frame)
+            self.duplicates_ignored = bulk_loader.duplicates_ignored
+            self.update_upload_history(
+                "INSERTING", f"{self.rows_processed} rows processed")
+
+        rows_per_second = round(bulk_loader.rows_per_second)
+        print(f"Upload {self.file_id}: {bulk_loader.rows_inserted} rows inserted, "
+              f"{bulk_loader.duplicates_ignored} duplicates ignored, {rows_per_second} rows/s")
+        message = f"{bulk_loader.rows_inserted} rows at {rows_per_second} rows/s"
+        if 'categorize' in file_meta_data:
+            self.update_upload_history("CATEGORIZING", message)
+            if self.categorize_expenses():
+                # The categorization watcher sets SUCCESS or FAILED when the job ends
+                return
+            message = "uploaded, categorization not started"
+        self.update_upload_history("SUCCESS", message)
+
+    def fail_upload_history(self, message):
+        """Mark the upload as failed, creating its history row if there is none yet."""
+        if self.file_id == -1:
+            self.insert_upload_history("FAILED", message)
+        else:
+            self.update_upload_history("FAILED", message)
 
     def insert_upload_history(self, status, message):
 
@@ -128,11 +197,12 @@ class FileUploader:
             db, cursor = get_db()
             update_query = """
                 UPDATE expense_insights.upload_history
-                SET status = %s, message = %s
+                SET status = %s, message = %s, rows_processed = %s, duplicates_ignored = %s
                 WHERE id = %s;
             """
             cursor.execute(
-                update_query, (status, message, self.file_id))
+                update_query, (status, message, self.rows_processed,
+                               self.duplicates_ignored, self.file_id))
             db.commit()
         except Exception as e:
             print(e)
@@ -155,9 +225,10 @@ class FileUploader:
 
             if response.status_code == 200:
                 print('classifier process started')
-            else:
-                print("error")
+                return True
+            print("error")
         except Exception as e:
             print(e)
+        return False
 
 
@@ -6,7 +6,8 @@ def get_upload_history(user_id):
     try:
         db, cursor = get_db()
         query = """
-            SELECT file_name, status, message, uploaded_at 
+            SELECT id, file_name, status, message, rows_processed,
+                   duplicates_ignored, uploaded_at
             FROM expense_insights.upload_history
             WHERE user_id = %s 
             ORDER BY uploaded_at DESC 
@@ -15,8 +16,9 @@ def get_upload_history(user_id):
         cursor.execute(query, (user_id,))
         result = cursor.fetchall()
         history = [
-            {"file_name": row[0], "status": row[1],
-                "message": row[2], "uploaded_at": row[3]}
+            {"file_id": row[0], "file_name": row[1], "status": row[2],
+                "message": row[3], "rows_processed": row[4],
+                "duplicates_ignored": row[5], "uploaded_at": row[6]}
             for row in result
         ]
         return jsonify({'status': 'success', 'data': history}), 200
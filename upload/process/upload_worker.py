@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from flask import current_app
+from db import get_db
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 2))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "uploads"))
+# Category service job status, polled for uploads being categorized
+CATEGORIZE_STATUS_URL = os.getenv(
+    "CATEGORIZE_STATUS_URL", "http://host.docker.internal:8082/classify/{file_id}/status")
+CATEGORIZE_POLL_SECONDS = float(os.getenv("CATEGORIZE_POLL_SECONDS", 10))
+
+# Statuses of an upload that this service is still working on. CATEGORIZING
+# is not one of them: the category service owns that job, and the
+# categorization watcher finishes it even after a restart
+IN_PROGRESS_STATUSES = ("QUEUED", "PROCESSING", "PARSING", "INSERTING")
+
+
+class UploadWorker:
+    """
+    Background pool that parses, inserts and hands off uploaded files for categorization.
+
+    The request spools the file to local disk and returns right away; a
+    worker thread then runs the upload with its own app context and deletes
+    the spooled file when done. Uploads handed to the category service stay
+    CATEGORIZING until the categorization watcher sees their job finish.
+    """
+
+    def __init__(self, max_workers=UPLOAD_WORKERS, spool_dir=UPLOAD_SPOOL_DIR):
+        self.spool_dir = spool_dir
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="upload")
+
+    def spool(self, file):
+        """
+        Save an uploaded file to the spool directory.
+
+        Returns:
+            Path of the spooled file
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".csv", dir=self.spool_dir)
+        os.close(fd)
+        file.save(path)
+        return path
+
+    def submit(self, file_uploader):
+        """Process a FileUploader whose file was spooled, in the background."""
+        app = current_app._get_current_object()
+        self.executor.submit(self.run, app, file_uploader)
+
+    def run(self, app, file_uploader):
+        try:
+            with app.app_context():
+                file_uploader.process()
+        finally:
+            try:
+                os.remove(file_uploader.file)
+            except OSError as e:
+                print(f"Error removing spooled upload: {e}")
+
+    def fail_interrupted(self, app):
+        """Mark uploads left in flight by a previous run as failed and delete their spooled files."""
+        try:
+            # Nothing is running yet, so every spooled file is a leftover
+            if os.path.isdir(self.spool_dir):
+                for name in os.listdir(self.spool_dir):
+                    os.remove(os.path.join(self.spool_dir, name))
+        except OSError as e:
+            print(f"Error removing spooled uploads: {e}")
+        try:
+            with app.app_context():
+                db, cursor = get_db()
+                cursor.execute(f"""
+                    UPDATE expense_insights.upload_history
+                    SET status = 'FAILED', message = 'interrupted, please upload again'
+                    WHERE status IN ({', '.join(['%s'] * len(IN_PROGRESS_STATUSES))})
+                """, IN_PROGRESS_STATUSES)
+                db.commit()
+        except Exception as e:
+            print(e)
+
+
+    def start_categorization_watch(self, app):
+        """Poll the category service for uploads being categorized, in a background thread."""
+        thread = threading.Thread(target=self._watch_categorization, args=(app,),
+                                  name="categorization-watch", daemon=True)
+        thread.start()
+
+    def _watch_categorization(self, app):
+        while True:
+            time.sleep(CATEGORIZE_POLL_SECONDS)
+            try:
+                with app.app_context():
+                    self.check_categorization()
+            except Exception as e:
+                print(e)
+
+    def check_categorization(self):
+        """Move CATEGORIZING uploads to SUCCESS or FAILED once their classification job ends."""
+        db, cursor = get_db()
+        cursor.execute(
+            "SELECT id FROM expense_insights.upload_history WHERE status = 'CATEGORIZING'")
+        for (file_id,) in cursor.fetchall():
+            response = requests.get(CATEGORIZE_STATUS_URL.format(file_id=file_id), timeout=10)
+            if response.status_code == 404:
+                status, message = "FAILED", "categorization job not found"
+            elif response.status_code != 200:
+                continue
+            else:
+                job_status = response.json()['job']['status']
+                if job_status == "COMPLETED":
+                    status, message = "SUCCESS", None
+                elif job_status == "FAILED":
+                    status, message = "FAILED", "categorization failed"
+                else:
+                    continue
+            # A successful upload keeps its insert summary as the message
+            cursor.execute("""
+                UPDATE expense_insights.upload_history
+                SET status = %s, message = COALESCE(%s, message)
+                WHERE id = %s AND status = 'CATEGORIZING'
+            """, (status, message, file_id))
+            db.commit()
+
+
+upload_worker = UploadWorker()
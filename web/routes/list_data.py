@@ -165,6 +165,8 @@ def show(user_id=None):
                     category_change = {}
                     if "category" in changes:
                         category_change["category"] = changes["category"]
+                        # Marks a manual correction, which reclassification never overwrites
+                        category_change["category_source"] = "user"
 
                     if category_change and update_expense(expense_id, category_change):
                         success_count += 1
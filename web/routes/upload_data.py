@@ -28,7 +28,7 @@ def show(user_id=None):
 
                     if response.ok:
                         status.update(label="✅ File uploaded successfully!", state="complete")
-                        st.success("Your file has been processed and uploaded.")
+                        st.success("Your file is being processed. Check Upload History for progress.")
                     else:
                         status.update(label="❌ Upload failed", state="error")
                         st.error(f"Upload failed with status code: {response.status_code}")
@@ -16,11 +16,13 @@ def show():
             df = pd.DataFrame(response_data["data"])
 
             if not df.empty:
-                df = df[["file_name", "status", "message", "uploaded_at"]]
+                df = df[["file_name", "status", "message", "rows_processed", "duplicates_ignored", "uploaded_at"]]
                 df.rename(columns={
                     "file_name": "📁 File",
                     "status": "🟢 Status",
                     "message": "📝 Message",
+                    "rows_processed": "🔢 Rows",
+                    "duplicates_ignored": "♻️ Duplicates",
                     "uploaded_at": "📅 Upload Date"
                 }, inplace=True)
 